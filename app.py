@@ -1,13 +1,10 @@
 import streamlit as st
-from PIL import Image
-import qrcode
-import os
-import cv2
 import logging
-from io import BytesIO
-import tempfile
-import numpy as np
 import base64
+import hashlib
+import re
+
+from qrgb import PREVIEW_SIZE, detect_mode, encode_png, generate_qrgb_bundle, image_preview, manual_decode_superposed_qr
 
 # Configuración inicial de la página
 st.set_page_config(
@@ -17,11 +14,6 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Configuración de paths y directorios temporales
-if not os.path.exists('qrgb_files'):
-    os.makedirs('qrgb_files', exist_ok=True)
-FOLDER_PATH = 'qrgb_files'
-
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,7 +23,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Estilos CSS mejorados
-st.markdown("""
+APP_CSS = """
     <style>
     .stApp {
         background-color: #ffffff;
@@ -186,6 +178,11 @@ st.markdown("""
         font-size: 18px;
         line-height: 1.6;
     }
+    .profile-grid {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        column-gap: 30px;
+    }
     .footer {
         text-align: center;
         margin-top: 50px;
@@ -201,346 +198,279 @@ st.markdown("""
         .subtitle {
             font-size: 28px;
         }
+        .profile-grid {
+            grid-template-columns: 1fr;
+        }
         .stButton>button {
             font-size: 16px;
             height: 50px;
         }
     }
     </style>
-""", unsafe_allow_html=True)
+"""
 
-# Sección de presentación del creador
-def show_creator_profile():
-    st.markdown('<div class="profile-box fade-in">', unsafe_allow_html=True)
-    st.markdown('<h2>👤 Autor:</h2>', unsafe_allow_html=True)
-    st.markdown('<p>© 2025 <strong>Ibar Federico Anderson, Ph.D., Master, Industrial Designer</strong>. All rights reserved.</p>', unsafe_allow_html=True)
-    
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown(
-            '<p>'
-            '🎓 <strong>Google Scholar:</strong> <a href="https://scholar.google.com/citations?user=mXD4RFUAAAAJ&hl=en" target="_blank">Visite Perfil</a>'
-            '</p>',
-            unsafe_allow_html=True
-        )
-        st.markdown(
-            '<p>'
-            '<img src="https://upload.wikimedia.org/wikipedia/commons/0/06/ORCID_iD.svg" width="20" height="20" style="vertical-align: middle; margin-right: 10px;">'
-            '<strong>ORCID:</strong> <a href="https://orcid.org/0000-0002-9732-3660" target="_blank">Visite Perfil</a>'
-            '</p>',
-            unsafe_allow_html=True
-        )
-    with col2:
-        st.markdown(
-            '<p>'
-            '<img src="https://upload.wikimedia.org/wikipedia/commons/5/5e/ResearchGate_icon_SVG.svg" width="20" height="20" style="vertical-align: middle; margin-right: 10px;">'
-            '<strong>Research Gate:</strong> <a href="https://www.researchgate.net/profile/Ibar-Anderson" target="_blank">Visite Perfil</a>'
-            '</p>',
-            unsafe_allow_html=True
-        )
-        st.markdown(
-            '<p>'
-            '📖 <strong>Creative Commons:</strong> This work is licensed under the <a href="https://creativecommons.org/licenses/by/4.0/" target="_blank">CC BY 4.0 License</a>.'
-            '</p>',
-            unsafe_allow_html=True
-        )
-    st.markdown('</div>', unsafe_allow_html=True)
+# Sección de presentación del creador (un único bloque HTML estático)
+CREATOR_PROFILE_HTML = """
+<div class="profile-box fade-in">
+    <h2>👤 Autor:</h2>
+    <p>© 2025 <strong>Ibar Federico Anderson, Ph.D., Master, Industrial Designer</strong>. All rights reserved.</p>
+    <div class="profile-grid">
+        <div>
+            <p>🎓 <strong>Google Scholar:</strong> <a href="https://scholar.google.com/citations?user=mXD4RFUAAAAJ&hl=en" target="_blank">Visite Perfil</a></p>
+            <p><img src="https://upload.wikimedia.org/wikipedia/commons/0/06/ORCID_iD.svg" width="20" height="20" style="vertical-align: middle; margin-right: 10px;"><strong>ORCID:</strong> <a href="https://orcid.org/0000-0002-9732-3660" target="_blank">Visite Perfil</a></p>
+        </div>
+        <div>
+            <p><img src="https://upload.wikimedia.org/wikipedia/commons/5/5e/ResearchGate_icon_SVG.svg" width="20" height="20" style="vertical-align: middle; margin-right: 10px;"><strong>Research Gate:</strong> <a href="https://www.researchgate.net/profile/Ibar-Anderson" target="_blank">Visite Perfil</a></p>
+            <p>📖 <strong>Creative Commons:</strong> This work is licensed under the <a href="https://creativecommons.org/licenses/by/4.0/" target="_blank">CC BY 4.0 License</a>.</p>
+        </div>
+    </div>
+</div>
+"""
+
+FOOTER_HTML = """
+<div class="footer">
+    <p>QRGB Generator v2.0 | © 2025 All Rights Reserved</p>
+</div>
+"""
+
+@st.cache_resource
+def minified_css(css):
+    # Quitar comentarios y espacios sobrantes una sola vez por proceso (los estilos se envían en
+    # cada ejecución completa de la página)
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return re.sub(r"\s+", " ", css).strip()
+
+@st.cache_resource
+def minified_html(html):
+    # Solo el sangrado entre etiquetas: el texto visible no cambia
+    return re.sub(r">\s+<", "><", html).strip()
 
-# Función para convertir imagen a base64 para descarga directa
-def get_image_download_link(img, filename, text):
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
+def show_static_markup():
+    # Estilos y perfil del creador en dos elementos; las secciones con fragmentos no los reenvían
+    st.markdown(minified_css(APP_CSS), unsafe_allow_html=True)
+    st.markdown(minified_html(CREATOR_PROFILE_HTML), unsafe_allow_html=True)
+
+# Función para convertir los bytes PNG ya codificados a base64 para descarga directa
+def get_image_download_link(png_bytes, filename, text):
+    img_str = base64.b64encode(png_bytes).decode()
     href = f'<a href="data:file/png;base64,{img_str}" download="{filename}" class="url-button">{text}</a>'
     return href
 
-# Funciones de QR mejoradas para mayor rendimiento y fiabilidad
-def create_qr(data, color, qr_version=10, box_size=10):
-    # Validar datos de entrada
-    if not data:
-        return None
-    
-    try:
-        qr = qrcode.QRCode(
-            version=qr_version,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=box_size,
-            border=4
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        # Mapeo de colores
-        color_map = {
-            "red": (255, 0, 0),
-            "green": (0, 255, 0),
-            "blue": (0, 0, 255),
-            "black": (0, 0, 0)
-        }
-        
-        # Usar color en formato RGB si está en el mapa, o usar el color directamente
-        fill_color = color_map.get(color, color)
-        
-        img = qr.make_image(fill_color=fill_color, back_color="white").convert('RGBA')
-        return img
-    except Exception as e:
-        logger.error(f"Error creating QR code: {str(e)}")
-        return None
+# Número máximo de resultados de generación memorizados por proceso
+GENERATION_CACHE_ENTRIES = 64
 
-def create_qr_with_logo(data, color, logo_file=None, qr_version=10, box_size=10):
-    img = create_qr(data, color, qr_version, box_size)
-    if img is None:
+@st.cache_data(max_entries=GENERATION_CACHE_ENTRIES, show_spinner=False)
+def cached_qrgb_bundle(red_data, green_data, blue_data, mode, logo_digest, _logo_bytes=None):
+    # La clave de caché es (capas, modo, hash del logo); los bytes del logo no se hashean de nuevo.
+    # Se memorizan miniaturas PNG para mostrar y el PNG completo solo para la descarga
+    bundle = generate_qrgb_bundle(red_data, green_data, blue_data, _logo_bytes, mode, preview_size=PREVIEW_SIZE)
+    if not bundle:
         return None
+    layers, combined_img, png_bytes = bundle
+    return tuple(encode_png(img) for img in layers), encode_png(combined_img), png_bytes
+
+def go_to(page):
+    # Callback de navegación: la página cambia antes de la nueva ejecución (un solo clic)
+    st.session_state.page = page
+
+def show_encode_result(result):
+    # Resultado guardado en la sesión: se vuelve a mostrar sin generar nada
+    (img_red, img_green, img_blue), combined_preview, byte_im = result["bundle"]
+    red_data, green_data, blue_data = result["data"]
     
-    if logo_file is not None:
-        try:
-            # Crear archivo temporal para el logo
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_logo:
-                temp_logo.write(logo_file.getvalue())
-                logo_path = temp_logo.name
-            
-            logo = Image.open(logo_path).convert("RGBA")
-            
-            # Redimensionar el logo a un tamaño proporcional
-            basewidth = img.size[0] // 4
-            wpercent = (basewidth / float(logo.size[0]))
-            hsize = int((float(logo.size[1]) * float(wpercent)))
-            logo = logo.resize((basewidth, hsize), Image.LANCZOS)
-            
-            # Posicionar el logo en el centro
-            pos = ((img.size[0] - logo.size[0]) // 2, (img.size[1] - logo.size[1]) // 2)
-            
-            # Crear una máscara para suavizar los bordes del logo
-            mask = logo.split()[3] if logo.mode == 'RGBA' else None
-            
-            # Pegar el logo en el QR code
-            img.paste(logo, pos, mask)
-            
-            # Eliminar el archivo temporal
-            try:
-                os.unlink(logo_path)
-            except:
-                pass
-                
-        except Exception as e:
-            logger.error(f"Error adding logo to QR: {str(e)}")
+    # Mostrar las tres capas individuales y la combinada
+    st.subheader("Capas del QRGB")
+    col_r, col_g, col_b, col_rgb = st.columns(4)
     
-    return img
-
-def combine_qr_images(img1, img2, img3, logo_file=None):
-    # Verificar que todas las imágenes son válidas
-    if any(img is None for img in [img1, img2, img3]):
-        logger.error("One or more QR images are invalid")
-        return None
+    with col_r:
+        st.image(img_red, caption="Capa Roja", width=150)
+    with col_g:
+        st.image(img_green, caption="Capa Verde", width=150)
+    with col_b:
+        st.image(img_blue, caption="Capa Azul", width=150)
+    with col_rgb:
+        st.image(combined_preview, caption="QRGB Combinado", width=150)
     
-    try:
-        # Asegurar que todas las imágenes tengan el mismo tamaño
-        size = img1.size
-        if img2.size != size:
-            img2 = img2.resize(size, Image.LANCZOS)
-        if img3.size != size:
-            img3 = img3.resize(size, Image.LANCZOS)
-        
-        # Crear imagen final
-        final_image = Image.new("RGBA", size, "black")
-        
-        # Obtener datos de píxeles de cada imagen
-        data_red = img1.getdata()
-        data_green = img2.getdata()
-        data_blue = img3.getdata()
+    # Información y descarga
+    st.success("¡QRGB generado con éxito!")
+    
+    # Información sobre las capas
+    st.markdown("<div class='result-box'>", unsafe_allow_html=True)
+    st.markdown("### Información Codificada:")
+    
+    st.markdown(f"<span class='color-red'>🔴 Capa Roja:</span> {red_data}", unsafe_allow_html=True)
+    st.markdown(f"<span class='color-green'>🟢 Capa Verde:</span> {green_data}", unsafe_allow_html=True)
+    st.markdown(f"<span class='color-blue'>🔵 Capa Azul:</span> {blue_data}", unsafe_allow_html=True)
+    
+    st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Opciones de descarga (bytes PNG ya codificados por el pipeline); la descarga no vuelve a
+    # ejecutar la página
+    col_download, col_info = st.columns([1, 2])
+    with col_download:
+        st.download_button(
+            label="💾 Descargar QRGB",
+            data=byte_im,
+            file_name="qrgb.png",
+            mime="image/png",
+            on_click="ignore",
+            use_container_width=True
+        )
+    with col_info:
+        st.info("Puedes escanear el QRGB con cualquier lector de QR estándar. Cada color mostrará un código diferente.")
+
+@st.fragment
+def encode_section():
+    # Fragmento aislado: escribir en los campos, subir un logo o generar solo vuelve a ejecutar
+    # esta sección (ni los estilos ni el perfil)
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        st.markdown("<span style='color:#e74c3c; font-size:18px; font-weight:bold'>🔴 Datos de la Capa Roja:</span>", unsafe_allow_html=True)
+        red_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa roja del QR", key="red_input")
         
-        # Combinar datos para crear la imagen final
-        new_data = []
-        for i in range(len(data_red)):
-            r1, g1, b1, a1 = data_red[i]
-            red_pixel = (r1, g1, b1) != (255, 255, 255)
-            
-            r2, g2, b2, a2 = data_green[i]
-            green_pixel = (r2, g2, b2) != (255, 255, 255)
-            
-            r3, g3, b3, a3 = data_blue[i]
-            blue_pixel = (r3, g3, b3) != (255, 255, 255)
-            
-            # Determinar el color basado en la combinación de píxeles
-            if red_pixel and green_pixel and blue_pixel:
-                new_data.append((255, 255, 255, 255))
-            elif red_pixel and green_pixel:
-                new_data.append((255, 255, 0, 255))
-            elif red_pixel and blue_pixel:
-                new_data.append((255, 0, 255, 255))
-            elif green_pixel and blue_pixel:
-                new_data.append((0, 255, 255, 255))
-            elif red_pixel:
-                new_data.append((255, 0, 0, 255))
-            elif green_pixel:
-                new_data.append((0, 255, 0, 255))
-            elif blue_pixel:
-                new_data.append((0, 0, 255, 255))
-            else:
-                new_data.append((0, 0, 0, 255))
+        st.markdown("<span style='color:#2ecc71; font-size:18px; font-weight:bold'>🟢 Datos de la Capa Verde:</span>", unsafe_allow_html=True)
+        green_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa verde del QR", key="green_input")
         
-        final_image.putdata(new_data)
+        st.markdown("<span style='color:#3498db; font-size:18px; font-weight:bold'>🔵 Datos de la Capa Azul:</span>", unsafe_allow_html=True)
+        blue_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa azul del QR", key="blue_input")
+    
+    with col2:
+        st.write("🖼️ Logo (Opcional)")
+        logo_file = st.file_uploader("", type=['png', 'jpg', 'jpeg'], help="Añade un logo en el centro del QR")
         
-        # Añadir logo si se proporciona
-        if logo_file is not None:
+        # Vista previa del logo
+        if logo_file:
+            st.image(logo_file, caption="Vista previa del logo", width=150)
+    
+    # Botones de acción
+    col_btn1, col_btn2 = st.columns([1, 1])
+    with col_btn1:
+        generate_button = st.button("✨ Generar QRGB", help="Generar el QRGB con los datos proporcionados", use_container_width=True)
+    with col_btn2:
+        if st.button("🏠 Volver", help="Volver al inicio", use_container_width=True):
+            # Cambiar de página exige ejecutar toda la aplicación, no solo el fragmento
+            go_to("inicio")
+            st.rerun()
+    
+    # Generar el QRGB
+    if generate_button:
+        if all([red_data, green_data, blue_data]):
             try:
-                # Crear archivo temporal para el logo
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_logo:
-                    temp_logo.write(logo_file.getvalue())
-                    logo_path = temp_logo.name
-                
-                logo = Image.open(logo_path).convert("RGBA")
-                
-                # Redimensionar el logo
-                basewidth = final_image.size[0] // 4
-                wpercent = (basewidth / float(logo.size[0]))
-                hsize = int((float(logo.size[1]) * float(wpercent)))
-                logo = logo.resize((basewidth, hsize), Image.LANCZOS)
-                
-                # Posicionar el logo en el centro
-                pos = ((final_image.size[0] - logo.size[0]) // 2, (final_image.size[1] - logo.size[1]) // 2)
-                
-                # Crear una máscara para suavizar los bordes del logo
-                mask = logo.split()[3] if logo.mode == 'RGBA' else None
-                
-                # Pegar el logo en el QR code
-                final_image.paste(logo, pos, mask)
-                
-                # Eliminar el archivo temporal
-                try:
-                    os.unlink(logo_path)
-                except:
-                    pass
+                with st.spinner('Generando QRGB...'):
+                    # Determinar el modo basado en el contenido
+                    mode = detect_mode(red_data, green_data, blue_data)
                     
+                    # Generar el QRGB (memorizado por capas, modo y hash del logo)
+                    logo_bytes = logo_file.getvalue() if logo_file else None
+                    logo_digest = hashlib.sha256(logo_bytes).hexdigest() if logo_bytes else None
+                    bundle = cached_qrgb_bundle(red_data, green_data, blue_data, mode, logo_digest, logo_bytes)
+                
+                # El resultado vive en la sesión: descargar o interactuar no lo descarta
+                st.session_state.encode_result = (
+                    {"data": (red_data, green_data, blue_data), "bundle": bundle} if bundle else None
+                )
+            
             except Exception as e:
-                logger.error(f"Error adding logo to combined QR: {str(e)}")
-        
-        return final_image
+                st.error(f"Error al generar QRGB: {str(e)}")
+                logger.error(f"Error generating QRGB: {str(e)}")
+        else:
+            st.warning("Por favor, completa todos los campos de texto.")
     
-    except Exception as e:
-        logger.error(f"Error combining QR images: {str(e)}")
-        return None
+    result = st.session_state.get("encode_result")
+    if result:
+        show_encode_result(result)
 
-def generate_qrgb(red_data, green_data, blue_data, logo_file=None, mode='link'):
-    try:
-        # Determinar la configuración óptima según el modo
-        qr_version = 10 if mode == 'link' else 3
-        box_size = 10 if mode == 'link' else 20
-        
-        # Generar los QR codes individuales
-        img_red = create_qr_with_logo(red_data, "red", logo_file, qr_version, box_size)
-        img_green = create_qr_with_logo(green_data, "green", logo_file, qr_version, box_size)
-        img_blue = create_qr_with_logo(blue_data, "blue", logo_file, qr_version, box_size)
-        
-        # Combinar los QR codes
-        combined_img = combine_qr_images(img_red, img_green, img_blue, logo_file)
-        
-        if combined_img:
-            # Guardar la imagen combinada
-            output_path = os.path.join(FOLDER_PATH, "superposed_qr.png")
-            combined_img.save(output_path)
-            return combined_img
-        else:
-            logger.error("Failed to generate combined QR image")
-            return None
-            
-    except Exception as e:
-        logger.error(f"Error in generate_qrgb: {str(e)}")
-        return None
+def upload_id(uploaded_file):
+    # Identificador del archivo subido (cambia al subir otro, aunque tenga el mismo nombre)
+    return getattr(uploaded_file, "file_id", None) or uploaded_file.name
 
-def manual_decode_superposed_qr(uploaded_file):
-    try:
-        # Crear archivo temporal para el QR
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-            temp_file.write(uploaded_file.getvalue())
-            temp_path = temp_file.name
-        
-        # Abrir la imagen
-        superposed_img = Image.open(temp_path).convert("RGBA")
-        superposed_data = superposed_img.getdata()
-        size = superposed_img.size
-        
-        # Inicializar imágenes para cada canal
-        red_data = [(255, 255, 255, 255)] * len(superposed_data)
-        green_data = [(255, 255, 255, 255)] * len(superposed_data)
-        blue_data = [(255, 255, 255, 255)] * len(superposed_data)
-        
-        # Extraer los canales
-        for i in range(len(superposed_data)):
-            r, g, b, a = superposed_data[i]
-            if r > 100:  # Umbral para detectar rojo
-                red_data[i] = (0, 0, 0, 255)
-            if g > 100:  # Umbral para detectar verde
-                green_data[i] = (0, 0, 0, 255)
-            if b > 100:  # Umbral para detectar azul
-                blue_data[i] = (0, 0, 0, 255)
-        
-        # Crear imágenes separadas para cada canal
-        red_img = Image.new("RGBA", size)
-        green_img = Image.new("RGBA", size)
-        blue_img = Image.new("RGBA", size)
-        
-        red_img.putdata(red_data)
-        green_img.putdata(green_data)
-        blue_img.putdata(blue_data)
-        
-        # Guardar las imágenes temporalmente para la decodificación
-        red_path = os.path.join(FOLDER_PATH, "decoded_red.png")
-        green_path = os.path.join(FOLDER_PATH, "decoded_green.png")
-        blue_path = os.path.join(FOLDER_PATH, "decoded_blue.png")
-        
-        red_img.save(red_path)
-        green_img.save(green_path)
-        blue_img.save(blue_path)
-        
-        # Decodificar las imágenes usando OpenCV
-        data_red = read_qr(red_path)
-        data_green = read_qr(green_path)
-        data_blue = read_qr(blue_path)
-        
-        # Limpiar archivos temporales
-        try:
-            os.unlink(temp_path)
-        except:
-            pass
-        
-        return data_red, data_green, data_blue, (red_img, green_img, blue_img)
+def show_decode_result(result):
+    data_red, data_green, data_blue = result["data"]
+    if not all(data is not None for data in [data_red, data_green, data_blue]):
+        st.warning("No se pudieron decodificar todas las capas del QRGB. Asegúrate de que la imagen sea un QRGB válido.")
+        return
+    
+    # Mostrar la imagen original y las capas separadas
+    st.subheader("Análisis del QRGB")
+    
+    col_orig, col_r, col_g, col_b = st.columns(4)
+    with col_orig:
+        st.image(result["original"], caption="QRGB Original", width=150)
+    
+    # Mostrar capas decodificadas si están disponibles
+    if result["layers"]:
+        red_img, green_img, blue_img = result["layers"]
+        with col_r:
+            st.image(red_img, caption="Capa Roja", width=150)
+        with col_g:
+            st.image(green_img, caption="Capa Verde", width=150)
+        with col_b:
+            st.image(blue_img, caption="Capa Azul", width=150)
+    
+    # Mostrar resultados
+    st.markdown('<div class="result-box">', unsafe_allow_html=True)
+    st.markdown("### Datos Decodificados:")
+    
+    # Función para mostrar y crear botones de URL
+    def display_layer_data(color_name, color_class, data, emoji):
+        st.markdown(f'<span class="{color_class}"><span class="symbol">{emoji}</span> Capa {color_name}:</span> {data if data else "No se pudo decodificar"}', unsafe_allow_html=True)
         
-    except Exception as e:
-        logger.error(f"Error in manual_decode_superposed_qr: {str(e)}")
-        return None, None, None, None
+        if data and ('http://' in data or 'https://' in data):
+            st.markdown(f'<a href="{data}" target="_blank" class="url-button url-button-{color_class.split("-")[1]}">🔗 Abrir URL {color_name}</a>', unsafe_allow_html=True)
+    
+    # Mostrar datos de cada capa
+    display_layer_data("Roja", "color-red", data_red, "🔴")
+    display_layer_data("Verde", "color-green", data_green, "🟢")
+    display_layer_data("Azul", "color-blue", data_blue, "🔵")
+    
+    st.markdown('</div>', unsafe_allow_html=True)
 
-def read_qr(filename):
-    try:
-        # Leer la imagen
-        img = cv2.imread(filename)
-        if img is None:
-            logger.error(f"Failed to read image: {filename}")
-            return None
-        
-        # Intentar decodificar con diferentes métodos para mayor robustez
-        detector = cv2.QRCodeDetector()
-        data, vertices_array, _ = detector.detectAndDecode(img)
-        
-        if vertices_array is not None:
-            return data
-        
-        # Si falló el primer intento, probar con preprocesamiento
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-        
-        data, vertices_array, _ = detector.detectAndDecode(thresh)
-        
-        return data if vertices_array is not None else None
+@st.fragment
+def decode_section():
+    # Fragmento aislado: subir, marcar la calibración o analizar solo vuelve a ejecutar esta sección
+    qr_file = st.file_uploader("🔍 Cargar imagen QRGB", type=['png', 'jpg', 'jpeg'], help="Selecciona un archivo QRGB para decodificar")
+    calibrate = st.checkbox("🎨 Calibrar colores", help="Ajusta la clasificación de colores a la foto (luz cálida, impresiones en cian/magenta)")
+    
+    col_btn1, col_btn2 = st.columns([1, 1])
+    with col_btn1:
+        decode_button = st.button("🔍 Analizar QRGB", help="Decodificar el QRGB cargado", use_container_width=True)
+    with col_btn2:
+        if st.button("🏠 Volver", help="Volver al inicio", use_container_width=True):
+            go_to("inicio")
+            st.rerun()
+    
+    # Decodificar el QR
+    if qr_file and decode_button:
+        st.session_state.decode_result = None
+        try:
+            with st.spinner('Analizando QRGB...'):
+                # Decodificar la imagen
+                data_red, data_green, data_blue, separated_images = manual_decode_superposed_qr(
+                    qr_file, calibrate=calibrate, preview_size=PREVIEW_SIZE
+                )
+                
+                # Guardar en la sesión los datos y las miniaturas ya codificadas en PNG
+                st.session_state.decode_result = {
+                    "file": upload_id(qr_file),
+                    "data": (data_red, data_green, data_blue),
+                    "original": image_preview(qr_file),
+                    "layers": tuple(encode_png(img) for img in separated_images) if separated_images else None,
+                }
         
-    except Exception as e:
-        logger.error(f"Error reading QR code: {str(e)}")
-        return None
+        except Exception as e:
+            st.error(f"Error al decodificar: {str(e)}")
+            logger.error(f"Error decoding QRGB: {str(e)}")
+    
+    # El resultado se muestra mientras siga cargada la misma imagen
+    result = st.session_state.get("decode_result")
+    if result and qr_file and result["file"] == upload_id(qr_file):
+        show_decode_result(result)
 
 # Interfaz principal mejorada con capacidades adicionales
 def main():
-    # Mostrar perfil del creador
-    show_creator_profile()
+    # Estilos y perfil del creador (marcado estático)
+    show_static_markup()
     
     # Inicializar estado de la sesión
     if 'page' not in st.session_state:
@@ -558,11 +488,11 @@ def main():
         
         col1, col2 = st.columns(2)
         with col1:
-            if st.button("🔒 Codificar QRGB", help="Codificar un nuevo QRGB", use_container_width=True):
-                st.session_state.page = "codificar"
+            st.button("🔒 Codificar QRGB", help="Codificar un nuevo QRGB", use_container_width=True,
+                      on_click=go_to, args=("codificar",))
         with col2:
-            if st.button("🔓 Decodificar QRGB", help="Decodificar un QRGB existente", use_container_width=True):
-                st.session_state.page = "decodificar"
+            st.button("🔓 Decodificar QRGB", help="Decodificar un QRGB existente", use_container_width=True,
+                      on_click=go_to, args=("decodificar",))
         
         # Información explicativa
         with st.expander("¿Qué es QRGB?"):
@@ -586,171 +516,16 @@ def main():
     elif st.session_state.page == "codificar":
         st.markdown('<div class="subtitle">Codificar QRGB</div>', unsafe_allow_html=True)
         st.markdown("<p>Ingresa los datos y sube un logo (opcional) para generar tu QRGB personalizado.</p>", unsafe_allow_html=True)
-        
-        # Campos de entrada con mejor organización
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            red_data = st.markdown("<span style='color:#e74c3c; font-size:18px; font-weight:bold'>🔴 Datos de la Capa Roja:</span>", unsafe_allow_html=True)
-            red_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa roja del QR", key="red_input")
-            
-            st.markdown("<span style='color:#2ecc71; font-size:18px; font-weight:bold'>🟢 Datos de la Capa Verde:</span>", unsafe_allow_html=True)
-            green_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa verde del QR", key="green_input")
-            
-            st.markdown("<span style='color:#3498db; font-size:18px; font-weight:bold'>🔵 Datos de la Capa Azul:</span>", unsafe_allow_html=True)
-            blue_data = st.text_input("", placeholder="Texto o URL", help="Introduce información para la capa azul del QR", key="blue_input")
-        
-        with col2:
-            st.write("🖼️ Logo (Opcional)")
-            logo_file = st.file_uploader("", type=['png', 'jpg', 'jpeg'], help="Añade un logo en el centro del QR")
-            
-            # Vista previa del logo
-            if logo_file:
-                st.image(logo_file, caption="Vista previa del logo", width=150)
-        
-        # Botones de acción
-        col_btn1, col_btn2 = st.columns([1, 1])
-        with col_btn1:
-            generate_button = st.button("✨ Generar QRGB", help="Generar el QRGB con los datos proporcionados", use_container_width=True)
-        with col_btn2:
-            if st.button("🏠 Volver", help="Volver al inicio", use_container_width=True):
-                st.session_state.page = "inicio"
-        
-        # Generar el QRGB
-        if generate_button:
-            if all([red_data, green_data, blue_data]):
-                try:
-                    with st.spinner('Generando QRGB...'):
-                        # Determinar el modo basado en el contenido
-                        mode = 'link' if any('http' in text.lower() for text in [red_data, green_data, blue_data]) else 'text'
-                        
-                        # Generar el QRGB
-                        combined_img = generate_qrgb(red_data, green_data, blue_data, logo_file, mode)
-                        
-                        if combined_img:
-                            # Mostrar las tres capas individuales y la combinada
-                            st.subheader("Capas del QRGB")
-                            col_r, col_g, col_b, col_rgb = st.columns(4)
-                            
-                            # Generar QRs individuales para mostrar
-                            img_red = create_qr(red_data, "red")
-                            img_green = create_qr(green_data, "green")
-                            img_blue = create_qr(blue_data, "blue")
-                            
-                            with col_r:
-                                st.image(img_red, caption="Capa Roja", width=150)
-                            with col_g:
-                                st.image(img_green, caption="Capa Verde", width=150)
-                            with col_b:
-                                st.image(img_blue, caption="Capa Azul", width=150)
-                            with col_rgb:
-                                st.image(combined_img, caption="QRGB Combinado", width=150)
-                            
-                            # Información y descarga
-                            st.success("¡QRGB generado con éxito!")
-                            
-                            # Información sobre las capas
-                            st.markdown("<div class='result-box'>", unsafe_allow_html=True)
-                            st.markdown("### Información Codificada:")
-                            
-                            st.markdown(f"<span class='color-red'>🔴 Capa Roja:</span> {red_data}", unsafe_allow_html=True)
-                            st.markdown(f"<span class='color-green'>🟢 Capa Verde:</span> {green_data}", unsafe_allow_html=True)
-                            st.markdown(f"<span class='color-blue'>🔵 Capa Azul:</span> {blue_data}", unsafe_allow_html=True)
-                            
-                            st.markdown("</div>", unsafe_allow_html=True)
-                            
-                            # Opciones de descarga
-                            buf = BytesIO()
-                            combined_img.save(buf, format="PNG")
-                            byte_im = buf.getvalue()
-                            
-                            col_download, col_info = st.columns([1, 2])
-                            with col_download:
-                                st.download_button(
-                                    label="💾 Descargar QRGB",
-                                    data=byte_im,
-                                    file_name="qrgb.png",
-                                    mime="image/png",
-                                    use_container_width=True
-                                )
-                            with col_info:
-                                st.info("Puedes escanear el QRGB con cualquier lector de QR estándar. Cada color mostrará un código diferente.")
-                    
-                except Exception as e:
-                    st.error(f"Error al generar QRGB: {str(e)}")
-                    logger.error(f"Error generating QRGB: {str(e)}")
-            else:
-                st.warning("Por favor, completa todos los campos de texto.")
+        encode_section()
     
     # Decodificar QRGB
     elif st.session_state.page == "decodificar":
         st.markdown('<div class="subtitle">Decodificar QRGB</div>', unsafe_allow_html=True)
         st.markdown("<p>Sube un QRGB para extraer la información de cada capa de color.</p>", unsafe_allow_html=True)
-        
-        # Subir QR
-        qr_file = st.file_uploader("🔍 Cargar imagen QRGB", type=['png', 'jpg', 'jpeg'], help="Selecciona un archivo QRGB para decodificar")
-        
-        col_btn1, col_btn2 = st.columns([1, 1])
-        with col_btn1:
-            decode_button = st.button("🔍 Analizar QRGB", help="Decodificar el QRGB cargado", use_container_width=True)
-        with col_btn2:
-            if st.button("🏠 Volver", help="Volver al inicio", use_container_width=True):
-                st.session_state.page = "inicio"
-        
-        # Decodificar el QR
-        if qr_file and decode_button:
-            try:
-                with st.spinner('Analizando QRGB...'):
-                    # Decodificar la imagen
-                    data_red, data_green, data_blue, separated_images = manual_decode_superposed_qr(qr_file)
-                    
-                    if all(data is not None for data in [data_red, data_green, data_blue]):
-                        # Mostrar la imagen original y las capas separadas
-                        st.subheader("Análisis del QRGB")
-                        
-                        col_orig, col_r, col_g, col_b = st.columns(4)
-                        with col_orig:
-                            st.image(qr_file, caption="QRGB Original", width=150)
-                        
-                        # Mostrar capas decodificadas si están disponibles
-                        if separated_images:
-                            red_img, green_img, blue_img = separated_images
-                            with col_r:
-                                st.image(red_img, caption="Capa Roja", width=150)
-                            with col_g:
-                                st.image(green_img, caption="Capa Verde", width=150)
-                            with col_b:
-                                st.image(blue_img, caption="Capa Azul", width=150)
-                        
-                        # Mostrar resultados
-                        st.markdown('<div class="result-box">', unsafe_allow_html=True)
-                        st.markdown("### Datos Decodificados:")
-                        
-                        # Función para mostrar y crear botones de URL
-                        def display_layer_data(color_name, color_class, data, emoji):
-                            st.markdown(f'<span class="{color_class}"><span class="symbol">{emoji}</span> Capa {color_name}:</span> {data if data else "No se pudo decodificar"}', unsafe_allow_html=True)
-                            
-                            if data and ('http://' in data or 'https://' in data):
-                                st.markdown(f'<a href="{data}" target="_blank" class="url-button url-button-{color_class.split("-")[1]}">🔗 Abrir URL {color_name}</a>', unsafe_allow_html=True)
-                        
-                        # Mostrar datos de cada capa
-                        display_layer_data("Roja", "color-red", data_red, "🔴")
-                        display_layer_data("Verde", "color-green", data_green, "🟢")
-                        display_layer_data("Azul", "color-blue", data_blue, "🔵")
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
-                    else:
-                        st.warning("No se pudieron decodificar todas las capas del QRGB. Asegúrate de que la imagen sea un QRGB válido.")
-                
-            except Exception as e:
-                st.error(f"Error al decodificar: {str(e)}")
-                logger.error(f"Error decoding QRGB: {str(e)}")
+        decode_section()
     
     # Pie de página con información de la versión
-    st.markdown("""
-    <div class="footer">
-        <p>QRGB Generator v2.0 | © 2025 All Rights Reserved</p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(minified_html(FOOTER_HTML), unsafe_allow_html=True)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,100 @@
+# Benchmark de combine_qr_images: bucle por píxel original vs. motor vectorizado
+#
+# Uso:
+#   python benchmarks/bench_combine.py
+#   python benchmarks/bench_combine.py --versions 1 10 20 40 --box-size 10 --repeat 3
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qrgb import combine_qr_images, create_qr  # noqa: E402
+
+# Implementación original (referencia para comparar salida y tiempos)
+def legacy_combine_qr_images(img1, img2, img3):
+    size = img1.size
+    if img2.size != size:
+        img2 = img2.resize(size, Image.LANCZOS)
+    if img3.size != size:
+        img3 = img3.resize(size, Image.LANCZOS)
+
+    final_image = Image.new("RGBA", size, "black")
+    data_red = img1.getdata()
+    data_green = img2.getdata()
+    data_blue = img3.getdata()
+
+    new_data = []
+    for i in range(len(data_red)):
+        r1, g1, b1, a1 = data_red[i]
+        red_pixel = (r1, g1, b1) != (255, 255, 255)
+        r2, g2, b2, a2 = data_green[i]
+        green_pixel = (r2, g2, b2) != (255, 255, 255)
+        r3, g3, b3, a3 = data_blue[i]
+        blue_pixel = (r3, g3, b3) != (255, 255, 255)
+
+        if red_pixel and green_pixel and blue_pixel:
+            new_data.append((255, 255, 255, 255))
+        elif red_pixel and green_pixel:
+            new_data.append((255, 255, 0, 255))
+        elif red_pixel and blue_pixel:
+            new_data.append((255, 0, 255, 255))
+        elif green_pixel and blue_pixel:
+            new_data.append((0, 255, 255, 255))
+        elif red_pixel:
+            new_data.append((255, 0, 0, 255))
+        elif green_pixel:
+            new_data.append((0, 255, 0, 255))
+        elif blue_pixel:
+            new_data.append((0, 0, 255, 255))
+        else:
+            new_data.append((0, 0, 0, 255))
+
+    final_image.putdata(new_data)
+    return final_image
+
+def best_of(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Bucle por píxel original vs. combine_qr_images vectorizado")
+    parser.add_argument("--versions", type=int, nargs="+", default=list(range(1, 41)))
+    parser.add_argument("--box-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="No medir el bucle original (lento en versiones altas)")
+    args = parser.parse_args()
+
+    print(f"{'version':>7} {'pixels':>10} {'legacy (s)':>11} {'vector (s)':>11} {'speedup':>8} {'identical':>9}")
+    for version in args.versions:
+        layers = [
+            create_qr(f"https://example.com/{color}/{version}", color, version, args.box_size)
+            for color in ("red", "green", "blue")
+        ]
+        pixels = layers[0].size[0] * layers[0].size[1]
+
+        vector_time, vector_img = best_of(lambda: combine_qr_images(*layers), args.repeat)
+        if args.skip_legacy:
+            print(f"{version:>7} {pixels:>10} {'-':>11} {vector_time:>11.4f} {'-':>8} {'-':>9}")
+            continue
+
+        legacy_time, legacy_img = best_of(lambda: legacy_combine_qr_images(*layers), 1)
+        # La salida vectorizada es indexada ("P"): se compara con sus colores RGBA
+        identical = legacy_img.tobytes() == vector_img.convert("RGBA").tobytes()
+        print(
+            f"{version:>7} {pixels:>10} {legacy_time:>11.4f} {vector_time:>11.4f} "
+            f"{legacy_time / vector_time:>7.1f}x {str(identical):>9}"
+        )
+        if not identical:
+            sys.exit(f"La salida vectorizada difiere de la original en la versión {version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Benchmark del constructor de matrices QR: qrcode.QRCode.make vs. qrgb.matrix.build_qr_matrix
+#
+# Uso:
+#   python benchmarks/bench_matrix.py
+#   python benchmarks/bench_matrix.py --versions 1 10 20 40 --repeat 5
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import qrcode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qrgb.matrix import build_qr_matrix, version_template  # noqa: E402
+
+def qrcode_matrix(data, version, error_correction):
+    qr = qrcode.QRCode(version=version, error_correction=error_correction)
+    qr.add_data(data)
+    qr.make(fit=False)
+    return np.array(qr.modules, dtype=bool)
+
+def best_of(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="qrcode vs. constructor vectorizado de matrices QR")
+    parser.add_argument("--versions", type=int, nargs="+", default=[1, 2, 5, 10, 15, 20, 25, 30, 35, 40])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    error_correction = qrcode.constants.ERROR_CORRECT_H
+    print(f"{'version':>7} {'modules':>8} {'qrcode (ms)':>12} {'numpy (ms)':>11} {'speedup':>8} {'identical':>9}")
+    for version in args.versions:
+        # Carga útil en modo byte que ocupa ~90 % de la capacidad de la versión
+        capacity = qrcode.util.BIT_LIMIT_TABLE[error_correction][version] // 8 - 3
+        data = ("https://example.com/catalogo/" + "x" * capacity)[:max(1, int(capacity * 0.9))]
+        # Las plantillas por versión se precalculan una vez por proceso
+        version_template(version)
+
+        qrcode_time, expected = best_of(lambda: qrcode_matrix(data, version, error_correction), args.repeat)
+        numpy_time, matrix = best_of(lambda: build_qr_matrix(data, version, error_correction), args.repeat)
+        identical = np.array_equal(expected, matrix)
+        print(
+            f"{version:>7} {matrix.shape[0]:>8} {qrcode_time * 1000:>12.2f} {numpy_time * 1000:>11.2f} "
+            f"{qrcode_time / numpy_time:>7.1f}x {str(identical):>9}"
+        )
+        if not identical:
+            sys.exit(f"La matriz vectorizada difiere de qrcode en la versión {version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Degradaciones sintéticas y deterministas para simular fotos de códigos QRGB (sin red ni archivos)
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+def blur(pixels, rng, sigma=2.0):
+    return cv2.GaussianBlur(pixels, (0, 0), sigma)
+
+def noise(pixels, rng, sigma=18.0):
+    noisy = pixels.astype(np.float32) + rng.normal(0.0, sigma, pixels.shape).astype(np.float32)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+def perspective(pixels, rng, jitter=0.08, margin=0.15):
+    # Colocar el código sobre un fondo gris y deformar sus esquinas como en una foto inclinada
+    height, width = pixels.shape[:2]
+    pad_y, pad_x = int(height * margin), int(width * margin)
+    canvas = np.full((height + 2 * pad_y, width + 2 * pad_x, 3), 128, dtype=np.uint8)
+    canvas[pad_y:pad_y + height, pad_x:pad_x + width] = pixels
+
+    src = np.float32([[pad_x, pad_y], [pad_x + width, pad_y], [pad_x + width, pad_y + height], [pad_x, pad_y + height]])
+    offsets = rng.uniform(-jitter, jitter, (4, 2)) * np.float32([width, height])
+    dst = (src + offsets).astype(np.float32)
+    matrix = cv2.getPerspectiveTransform(src, dst)
+    return cv2.warpPerspective(canvas, matrix, (canvas.shape[1], canvas.shape[0]), borderValue=(128, 128, 128))
+
+def jpeg(pixels, rng, quality=45):
+    buf = BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=quality)
+    return np.asarray(Image.open(BytesIO(buf.getvalue())).convert("RGB"))
+
+def photo(pixels, rng):
+    # Combinación de todas las degradaciones, en el orden en que ocurren en una cámara
+    return jpeg(noise(blur(perspective(pixels, rng), rng, 1.5), rng, 10.0), rng, 70)
+
+def phone(pixels, rng, size=(4000, 3000), coverage=0.4):
+    # Foto de móvil a resolución completa: el código ocupa una parte del encuadre sobre fondo gris
+    width, height = size
+    side = int(min(width, height) * coverage)
+    code = cv2.resize(pixels, (side, side), interpolation=cv2.INTER_NEAREST)
+    canvas = np.full((height, width, 3), 128, dtype=np.uint8)
+    top, left = (height - side) // 2, (width - side) // 2
+    canvas[top:top + side, left:left + side] = code
+    return noise(blur(canvas, rng, 2.0), rng, 8.0)
+
+DEGRADATIONS = {
+    "clean": lambda pixels, rng: pixels,
+    "blur": blur,
+    "noise": noise,
+    "perspective": perspective,
+    "jpeg": jpeg,
+    "photo": photo,
+    "phone": phone,
+}
+
+# Formato en que se entrega cada degradación (las fotos de móvil llegan como JPEG)
+DEGRADATION_FORMATS = {"phone": "JPEG"}
+
+def degrade(img, name, seed=0):
+    # Devuelve los bytes de la imagen degradada (lo que recibiría el decodificador)
+    rng = np.random.default_rng(seed)
+    pixels = np.asarray(img.convert("RGB"))
+    degraded = DEGRADATIONS[name](pixels, rng)
+    buf = BytesIO()
+    image_format = DEGRADATION_FORMATS.get(name, "PNG")
+    if image_format == "JPEG":
+        Image.fromarray(degraded).save(buf, format="JPEG", quality=90)
+    else:
+        Image.fromarray(degraded).save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
@@ -0,0 +1,260 @@
+# Suite de benchmarks reproducible (sin red) para las rutas críticas de codificación y decodificación
+#
+# Uso:
+#   python benchmarks/run_benchmarks.py                          # perfil rápido
+#   python benchmarks/run_benchmarks.py --profile full           # versiones 1-40
+#   python benchmarks/run_benchmarks.py --save benchmarks/baselines/baseline.json
+#   python benchmarks/run_benchmarks.py --compare benchmarks/baselines/baseline.json
+#
+# Para cada caso se informan percentiles de latencia, memoria pico (tracemalloc: asignaciones de
+# Python y NumPy) y, en decodificación, la tasa de éxito. --compare termina con código 1 si hay
+# regresiones respecto a la línea base.
+import argparse
+import functools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import qrgb  # noqa: E402
+import qrgb.decode  # noqa: E402
+import qrgb.store  # noqa: E402
+from degrade import DEGRADATIONS, degrade  # noqa: E402
+from qrgb import (  # noqa: E402
+    combine_qr_images,
+    create_qr,
+    create_qr_with_logo,
+    generate_qrgb,
+    manual_decode_superposed_qr,
+    read_qr,
+    split_qrgb_channels,
+)
+
+PROFILES = {
+    "quick": {"versions": [1, 5, 10, 20, 40], "box_sizes": [4, 10], "repeat": 5, "decode_samples": 6},
+    "full": {"versions": list(range(1, 41)), "box_sizes": [2, 4, 10, 20], "repeat": 15, "decode_samples": 20},
+}
+
+PAYLOADS = {
+    "link": ("https://example.com/rojo", "https://example.com/verde", "https://example.com/azul"),
+    "text": ("capa roja", "capa verde", "capa azul"),
+}
+
+def make_logo():
+    # Logo sintético con transparencia (círculo naranja sobre fondo transparente)
+    logo = Image.new("RGBA", (240, 160), (0, 0, 0, 0))
+    ImageDraw.Draw(logo).ellipse((8, 8, 232, 152), fill=(230, 126, 34, 255))
+    buf = BytesIO()
+    logo.save(buf, format="PNG")
+    return BytesIO(buf.getvalue())
+
+def percentile(values, q):
+    return float(np.percentile(np.asarray(values) * 1000.0, q))
+
+def measure(func, repeat, success=None):
+    # Calentamiento: primeras importaciones y cachés de cada caso fuera de la medición
+    func()
+
+    latencies = []
+    successes = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - start)
+        if success is not None:
+            successes.append(bool(success(result)))
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {
+        "min_ms": float(min(latencies) * 1000.0),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": float(np.mean(latencies) * 1000.0),
+        "peak_kib": peak / 1024.0,
+    }
+    if success is not None:
+        record["success_rate"] = sum(successes) / len(successes)
+    return record
+
+def encode_cases(profile, logo):
+    for version in profile["versions"]:
+        for box_size in profile["box_sizes"]:
+            params = {"version": version, "box_size": box_size}
+            yield "create_qr", params, lambda v=version, b=box_size: create_qr(PAYLOADS["link"][0], "red", v, b), None
+
+        params = {"version": version, "box_size": 10, "logo": True}
+        yield (
+            "create_qr_with_logo", params,
+            lambda v=version: create_qr_with_logo(PAYLOADS["link"][0], "red", logo, v, 10), None,
+        )
+
+        layers = [create_qr(data, color, version, 10) for data, color in zip(PAYLOADS["link"], ("red", "green", "blue"))]
+        yield "combine_qr_images", {"version": version, "box_size": 10}, lambda layers=layers: combine_qr_images(*layers), None
+
+    for mode, payloads in PAYLOADS.items():
+        for with_logo in (False, True):
+            params = {"mode": mode, "logo": with_logo}
+            yield (
+                "generate_qrgb", params,
+                lambda p=payloads, m=mode, w=with_logo: generate_qrgb(*p, logo if w else None, m), None,
+            )
+
+def decode_cases(profile, logo):
+    samples = profile["decode_samples"]
+    for mode, payloads in PAYLOADS.items():
+        for with_logo in (False, True):
+            img = generate_qrgb(*payloads, logo if with_logo else None, mode)
+            for degradation in DEGRADATIONS:
+                # Varias muestras por degradación (semillas distintas) recorridas de forma cíclica
+                images = [degrade(img, degradation, seed) for seed in range(samples)]
+                params = {"mode": mode, "logo": with_logo, "degradation": degradation}
+                state = {"index": 0}
+
+                def decode_next(images=images, state=state):
+                    image_bytes = images[state["index"] % len(images)]
+                    state["index"] += 1
+                    return manual_decode_superposed_qr(image_bytes)
+
+                yield (
+                    "manual_decode_superposed_qr", params, decode_next,
+                    lambda result, p=payloads: tuple(result[:3]) == tuple(p),
+                )
+
+                if mode == "link" and not with_logo:
+                    planes = [split_qrgb_channels(Image.open(BytesIO(data)))[0] for data in images]
+                    read_state = {"index": 0}
+
+                    def read_next(planes=planes, state=read_state):
+                        plane = planes[state["index"] % len(planes)]
+                        state["index"] += 1
+                        return read_qr(plane)
+
+                    yield (
+                        "read_qr", {"degradation": degradation}, read_next,
+                        lambda result, expected=payloads[0]: result == expected,
+                    )
+
+def case_key(name, params):
+    return name + "[" + ",".join(f"{key}={params[key]}" for key in sorted(params)) + "]"
+
+def run(profile_name, only=None):
+    # Devuelve el informe y, por clave de caso, cómo volver a medirlo (para confirmar regresiones)
+    profile = PROFILES[profile_name]
+    logo = make_logo()
+    results = []
+    remeasure = {}
+    for cases in (encode_cases(profile, logo), decode_cases(profile, logo)):
+        for name, params, func, success in cases:
+            if only and name not in only:
+                continue
+            record = {"name": name, "params": params, **measure(func, profile["repeat"], success)}
+            results.append(record)
+            remeasure[case_key(name, params)] = functools.partial(measure, func, profile["repeat"], success)
+            rate = f" success={record['success_rate']:.0%}" if "success_rate" in record else ""
+            print(
+                f"{case_key(name, params):<80} p50={record['p50_ms']:9.2f}ms p90={record['p90_ms']:9.2f}ms "
+                f"p99={record['p99_ms']:9.2f}ms peak={record['peak_kib']:10.0f}KiB{rate}",
+                flush=True,
+            )
+    return {
+        "meta": {
+            "profile": profile_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "pillow": Image.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }, remeasure
+
+def compare(report, baseline, tolerance, success_tolerance, noise_ms=0.0, remeasure=None, retries=0):
+    # Regresión: latencia o memoria pico por encima de la tolerancia, o menor tasa de éxito.
+    # La latencia se compara con el mínimo de las repeticiones (p50 en líneas base antiguas), que es
+    # lo menos sensible a otros procesos, con un margen absoluto de noise_ms. Los casos que lo superan
+    # se vuelven a medir al final, en rondas intercaladas (el ruido de la máquina llega a ráfagas),
+    # y solo son regresión si ninguna de las retries rondas baja del límite
+    baseline_results = {case_key(r["name"], r["params"]): r for r in baseline["results"]}
+    regressions = []
+    suspects = {}
+    for record in report["results"]:
+        key = case_key(record["name"], record["params"])
+        previous = baseline_results.get(key)
+        if previous is None:
+            continue
+        metric = "min_ms" if "min_ms" in previous and "min_ms" in record else "p50_ms"
+        limit = max(previous[metric] * (1 + tolerance), previous[metric] + noise_ms)
+        if record[metric] > limit:
+            suspects[key] = (metric, previous[metric], limit, record[metric])
+        if record["peak_kib"] > previous["peak_kib"] * (1 + tolerance):
+            regressions.append(f"{key}: peak {previous['peak_kib']:.0f}KiB -> {record['peak_kib']:.0f}KiB")
+        if "success_rate" in previous and record.get("success_rate", 0) < previous["success_rate"] - success_tolerance:
+            regressions.append(f"{key}: success {previous['success_rate']:.0%} -> {record['success_rate']:.0%}")
+
+    for _ in range(retries if remeasure else 0):
+        for key, (metric, before, limit, current) in list(suspects.items()):
+            if key not in remeasure:
+                continue
+            current = min(current, remeasure[key]()[metric])
+            if current <= limit:
+                del suspects[key]
+            else:
+                suspects[key] = (metric, before, limit, current)
+    for key, (metric, before, limit, current) in suspects.items():
+        regressions.append(f"{key}: {metric[:-3]} {before:.2f}ms -> {current:.2f}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de codificación/decodificación QRGB")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--only", nargs="+", help="Ejecutar solo estas funciones (p. ej. read_qr generate_qrgb)")
+    parser.add_argument("--save", help="Guardar el informe JSON en esta ruta")
+    parser.add_argument("--compare", help="Línea base JSON con la que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Regresión relativa admitida en latencia y memoria")
+    parser.add_argument("--success-tolerance", type=float, default=0.05, help="Caída admitida en la tasa de éxito")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="Diferencia absoluta de latencia que se considera ruido")
+    parser.add_argument("--retries", type=int, default=3, help="Rondas de nuevas mediciones de un caso antes de darlo por regresión")
+    args = parser.parse_args()
+
+    # Sin almacén de resultados ni caché de decodificación: cada repetición mide el proceso completo
+    qrgb.store.result_store.max_bytes = 0
+    qrgb.decode.decode_cache.max_bytes = 0
+    report, remeasure = run(args.profile, set(args.only) if args.only else None)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+            output_file.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(
+            report, baseline, args.tolerance, args.success_tolerance, args.noise_ms, remeasure, args.retries
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Motor QRGB sin interfaz: se puede importar sin Streamlit (p. ej. desde workers o pruebas)
+from .calibration import calibrate_colors, get_profile, load_profiles, save_profiles, set_profile
+from .colors import build_color_lut, classify_pixels
+from .decode import (
+    CHANNEL_THRESHOLD,
+    DECODE_METHODS,
+    decode_cache,
+    decode_channels,
+    decode_image,
+    decode_plane_at,
+    decode_superposed,
+    image_digest,
+    image_preview,
+    locate_symbol,
+    manual_decode_superposed_qr,
+    read_qr,
+    rectify_symbol,
+    rgb_pixels,
+    split_qrgb_channels,
+)
+from .encode import (
+    LAYER_COLORS,
+    PNG_SAVE_OPTIONS,
+    PREVIEW_SIZE,
+    QR_BORDER,
+    QRGB_PALETTE,
+    combine_qr_images,
+    compose_color_index,
+    create_layer_matrices,
+    create_qr,
+    create_qr_with_logo,
+    detect_mode,
+    encode_png,
+    fit_nearest,
+    generate_qrgb,
+    generate_qrgb_bundle,
+    render_color_index,
+    render_layer,
+)
+from .export import export_qrgb, write_pdf, write_png_stream, write_svg
+from .grid import classify_modules, decode_module_grid, sample_module_grid
+from .layout import minimal_version, plan_error_correction, plan_qr_layout
+from .logo import get_logo_variant
+from .matrix import build_qr_matrix, cached_qr_matrix
+from .matrix_decode import MatrixDecodeError, decode_qr_matrix
+from .metrics import log_metrics, metrics_snapshot, operation, prometheus_text, reset_metrics, stage
+from .store import FOLDER_PATH, ResultStore, result_key, result_store
+
+__all__ = [
+    "CHANNEL_THRESHOLD",
+    "DECODE_METHODS",
+    "FOLDER_PATH",
+    "LAYER_COLORS",
+    "MatrixDecodeError",
+    "PNG_SAVE_OPTIONS",
+    "PREVIEW_SIZE",
+    "QR_BORDER",
+    "QRGB_PALETTE",
+    "ResultStore",
+    "build_color_lut",
+    "build_qr_matrix",
+    "cached_qr_matrix",
+    "calibrate_colors",
+    "classify_modules",
+    "classify_pixels",
+    "combine_qr_images",
+    "compose_color_index",
+    "create_layer_matrices",
+    "create_qr",
+    "create_qr_with_logo",
+    "decode_cache",
+    "decode_channels",
+    "decode_image",
+    "decode_module_grid",
+    "decode_plane_at",
+    "decode_qr_matrix",
+    "decode_superposed",
+    "detect_mode",
+    "encode_png",
+    "export_qrgb",
+    "fit_nearest",
+    "generate_qrgb",
+    "generate_qrgb_bundle",
+    "get_logo_variant",
+    "get_profile",
+    "image_digest",
+    "image_preview",
+    "load_profiles",
+    "locate_symbol",
+    "log_metrics",
+    "manual_decode_superposed_qr",
+    "metrics_snapshot",
+    "minimal_version",
+    "operation",
+    "plan_error_correction",
+    "plan_qr_layout",
+    "prometheus_text",
+    "read_qr",
+    "rectify_symbol",
+    "render_color_index",
+    "render_layer",
+    "reset_metrics",
+    "result_key",
+    "result_store",
+    "rgb_pixels",
+    "sample_module_grid",
+    "save_profiles",
+    "set_profile",
+    "split_qrgb_channels",
+    "stage",
+    "write_pdf",
+    "write_png_stream",
+    "write_svg",
+]
@@ -0,0 +1,100 @@
+# Línea de comandos del motor QRGB: python -m qrgb <comando> ...
+import argparse
+import json
+import logging
+import sys
+
+def _generate(args):
+    from .batch import run_batch_generate
+
+    logo_bytes = None
+    if args.logo:
+        with open(args.logo, "rb") as logo_file:
+            logo_bytes = logo_file.read()
+
+    stats = run_batch_generate(
+        args.input,
+        args.output,
+        workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        mode=args.mode,
+        logo_bytes=logo_bytes,
+        resume=not args.no_resume,
+        report_every=args.report_every,
+    )
+    print(json.dumps(stats))
+    return 0 if stats["failed"] == 0 else 1
+
+def _decode(args):
+    from .batch import run_batch_decode
+
+    options = dict(workers=args.workers, max_in_flight=args.max_in_flight, report_every=args.report_every,
+                   calibrate=args.calibrate, profiles_path=args.profiles)
+    if args.output == "-":
+        stats = run_batch_decode(args.source, sys.stdout, **options)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output_stream:
+            stats = run_batch_decode(args.source, output_stream, **options)
+    print(json.dumps(stats), file=sys.stderr)
+    return 0 if stats["failed"] == 0 else 1
+
+def _export(args):
+    from .export import export_qrgb
+
+    written = export_qrgb(args.red, args.green, args.blue, args.output, fmt=args.format,
+                          module_mm=args.module_mm, dpi=args.dpi)
+    return 0 if written else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m qrgb", description="Herramientas por lotes para QRGB")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser(
+        "generate",
+        help="Generar QRGB en lote desde CSV/JSONL (columnas: id, red, green, blue, mode opcional)",
+    )
+    generate.add_argument("input", help="Archivo .csv o .jsonl de entrada")
+    generate.add_argument("output", help="Directorio de salida o archivo .zip")
+    generate.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto: núcleos)")
+    generate.add_argument("--max-in-flight", type=int, default=None, help="Trabajos pendientes como máximo (por defecto: 4 x workers)")
+    generate.add_argument("--mode", choices=["auto", "link", "text"], default="auto")
+    generate.add_argument("--logo", default=None, help="Logo opcional para todos los códigos")
+    generate.add_argument("--no-resume", action="store_true", help="No omitir los códigos ya presentes en la salida")
+    generate.add_argument("--report-every", type=float, default=5.0, help="Segundos entre informes de progreso")
+    generate.set_defaults(func=_generate)
+
+    decode = subparsers.add_parser(
+        "decode",
+        help="Decodificar en lote las imágenes de un directorio, patrón glob o ZIP (salida JSONL)",
+    )
+    decode.add_argument("source", help="Directorio, patrón glob (entre comillas) o archivo .zip")
+    decode.add_argument("-o", "--output", default="-", help="Archivo JSONL de salida (por defecto: stdout)")
+    decode.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto: núcleos)")
+    decode.add_argument("--max-in-flight", type=int, default=None, help="Imágenes pendientes como máximo (por defecto: 2 x workers)")
+    decode.add_argument("--report-every", type=float, default=5.0, help="Segundos entre informes de progreso")
+    decode.add_argument("--calibrate", action="store_true", help="Calibrar los colores en cada foto")
+    decode.add_argument("--profiles", default=None, help="Perfiles de color por dispositivo (JSON de save_profiles)")
+    decode.set_defaults(func=_decode)
+
+    export = subparsers.add_parser(
+        "export",
+        help="Exportar un QRGB para impresión (PNG en streaming, SVG o PDF vectorial)",
+    )
+    export.add_argument("red", help="Datos de la capa roja")
+    export.add_argument("green", help="Datos de la capa verde")
+    export.add_argument("blue", help="Datos de la capa azul")
+    export.add_argument("output", help="Archivo de salida (.png, .svg o .pdf)")
+    export.add_argument("--format", choices=["png", "svg", "pdf"], default=None, help="Formato (por defecto: según la extensión)")
+    export.add_argument("--module-mm", type=float, default=1.0, help="Tamaño de cada módulo en milímetros")
+    export.add_argument("--dpi", type=int, default=300, help="Resolución de la salida PNG")
+    export.set_defaults(func=_export)
+
+    return parser
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+# Procesamiento masivo de QRGB: generación desde CSV/JSONL y decodificación de carpetas/ZIP
+# repartidas en un pool de procesos con trabajo en vuelo acotado
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import struct
+import sys
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from .calibration import load_profiles
+from .decode import decode_image
+from .encode import detect_mode, generate_qrgb_bundle
+from .metrics import operation, stage
+
+logger = logging.getLogger(__name__)
+
+LAYER_KEYS = ("red", "green", "blue")
+
+# Caracteres permitidos en los nombres de archivo de salida
+_UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+def read_rows(path):
+    # Lectura perezosa fila a fila: JSONL (.jsonl/.ndjson) o CSV con cabecera. Una fila ilegible
+    # se entrega como None para que cuente como fallida sin detener el lote
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as input_file:
+        if ext in ('.jsonl', '.ndjson'):
+            for row_number, line in enumerate(input_file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Invalid JSON in row {row_number} of {path}: {str(e)}")
+                    row = None
+                yield row_number, row
+        else:
+            reader = csv.DictReader(input_file)
+            row_number = 0
+            while True:
+                row_number += 1
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    logger.warning(f"Invalid CSV in row {row_number} of {path}: {str(e)}")
+                    row = None
+                yield row_number, row
+
+def output_name(row_id):
+    # Nombre de archivo seguro para un id. Si hay que sustituir caracteres se añade un hash corto
+    # del id original: "a/b" y "a_b" no pueden compartir archivo
+    name = _UNSAFE_NAME_CHARS.sub("_", row_id)
+    if name != row_id:
+        name = f"{name}-{hashlib.sha256(row_id.encode('utf-8')).hexdigest()[:8]}"
+    return name
+
+def iter_jobs(rows, mode='auto'):
+    # Convertir cada fila en un trabajo (nombre, rojo, verde, azul, modo); una fila ilegible o que
+    # no es un objeto produce None
+    for row_number, row in rows:
+        if not isinstance(row, dict):
+            if row is not None:
+                logger.warning(f"Row {row_number} is not an object")
+            yield None
+            continue
+        row_id = output_name(str(row.get("id") or row_number))
+        red_data, green_data, blue_data = (str(row.get(key) or "") for key in LAYER_KEYS)
+        row_mode = row.get("mode") or mode
+        if row_mode == 'auto':
+            row_mode = detect_mode(red_data, green_data, blue_data)
+        yield row_id, red_data, green_data, blue_data, row_mode
+
+class DirectoryWriter:
+    # Escribe un PNG por código en un directorio; cada archivo se escribe de forma atómica
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.done = {name[:-4] for name in os.listdir(path) if name.endswith(".png")}
+
+    def write(self, row_id, png_bytes):
+        final_path = os.path.join(self.path, f"{row_id}.png")
+        temp_path = f"{final_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as output_file:
+            output_file.write(png_bytes)
+        os.replace(temp_path, final_path)
+        self.done.add(row_id)
+
+    def close(self, complete=True):
+        pass
+
+# Cabecera local de una entrada ZIP (firma, versión, flags, método, hora, fecha, CRC, tamaños,
+# longitudes del nombre y del campo extra)
+_ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_ZIP_LOCAL_SIGNATURE = b"PK\x03\x04"
+# Bit de flags: tamaños y CRC en un descriptor tras los datos (no se escriben en archivos con seek)
+_ZIP_DATA_DESCRIPTOR = 0x08
+
+def _recover_zip_entries(path):
+    # Entradas completas de un ZIP sin directorio central (proceso terminado con SIGKILL): se
+    # recorren las cabeceras locales hasta la primera truncada o con CRC incorrecto
+    with open(path, "rb") as archive_file:
+        while True:
+            header = archive_file.read(_ZIP_LOCAL_HEADER.size)
+            if len(header) < _ZIP_LOCAL_HEADER.size:
+                return
+            signature, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(header)
+            if signature != _ZIP_LOCAL_SIGNATURE or flags & _ZIP_DATA_DESCRIPTOR or method != zipfile.ZIP_STORED:
+                return
+            name = archive_file.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+            archive_file.seek(extra_length, os.SEEK_CUR)
+            data = archive_file.read(compressed_size)
+            if len(data) < compressed_size or compressed_size != size or zlib.crc32(data) != crc:
+                return
+            yield name, data
+
+class ZipWriter:
+    # Añade cada PNG al ZIP en cuanto está listo (sin recomprimir: el PNG ya está comprimido).
+    # Se escribe en path + ".part" y solo se renombra al cerrar una ejecución completa, así que un
+    # ZIP a medias nunca ocupa la ruta final. Al reanudar tras una
+    # interrupción, las entradas completas del .part se recuperan de sus cabeceras locales
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.part_path = f"{path}.part"
+        if resume and os.path.exists(self.part_path):
+            self._recover_part()
+            mode = "a"
+        elif resume and os.path.exists(path):
+            # Se añade sobre una copia: el ZIP completo sigue intacto hasta el nuevo cierre
+            shutil.copyfile(path, self.part_path)
+            mode = "a"
+        else:
+            mode = "w"
+        self.archive = zipfile.ZipFile(self.part_path, mode, compression=zipfile.ZIP_STORED)
+        self.done = {name[:-4] for name in self.archive.namelist() if name.endswith(".png")}
+
+    def _recover_part(self):
+        try:
+            with zipfile.ZipFile(self.part_path):
+                return
+        except zipfile.BadZipFile:
+            pass
+        recovered_path = f"{self.part_path}.recover"
+        with zipfile.ZipFile(recovered_path, "w", compression=zipfile.ZIP_STORED) as recovered:
+            for name, data in _recover_zip_entries(self.part_path):
+                recovered.writestr(name, data)
+            count = len(recovered.namelist())
+        os.replace(recovered_path, self.part_path)
+        logger.info(f"Recovered {count} entries from interrupted archive {self.part_path}")
+
+    def write(self, row_id, png_bytes):
+        self.archive.writestr(f"{row_id}.png", png_bytes)
+        self.done.add(row_id)
+
+    def close(self, complete=True):
+        # Tras un error el .part queda cerrado (con directorio central) para la siguiente ejecución
+        self.archive.close()
+        if complete:
+            os.replace(self.part_path, self.path)
+
+def open_writer(output, resume=True):
+    if output.lower().endswith(".zip"):
+        return ZipWriter(output, resume)
+    writer = DirectoryWriter(output)
+    if not resume:
+        writer.done = set()
+    return writer
+
+# Logo compartido por cada proceso del pool (se envía una sola vez por proceso)
+_worker_logo = None
+
+def _init_worker(logo_bytes):
+    global _worker_logo
+    _worker_logo = logo_bytes
+
+def _generate_job(job):
+    row_id, red_data, green_data, blue_data, mode = job
+    start = time.perf_counter()
+    bundle = generate_qrgb_bundle(
+        red_data, green_data, blue_data, _worker_logo, mode, with_layers=False, save=False
+    )
+    return row_id, bundle[2] if bundle else None, time.perf_counter() - start
+
+def _report(stats, workers, stream):
+    elapsed = max(time.perf_counter() - stats["start"], 1e-9)
+    rate = stats["generated"] / elapsed
+    stream.write(
+        f"generated={stats['generated']} failed={stats['failed']} skipped={stats['skipped']} "
+        f"elapsed={elapsed:.1f}s rate={rate:.1f} codes/s ({rate / workers:.1f} codes/s per core)\n"
+    )
+    stream.flush()
+
+def _bounded_map(executor, func, jobs, max_in_flight):
+    # Como executor.map, pero con un número acotado de trabajos en vuelo y resultados
+    # en orden de llegada: la memoria no crece con el tamaño de la entrada
+    pending = set()
+    for job in jobs:
+        pending.add(executor.submit(func, job))
+        if len(pending) >= max_in_flight:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+    for future in as_completed(pending):
+        yield future.result()
+
+def run_batch_generate(input_path, output, workers=None, max_in_flight=None, mode='auto',
+                       logo_bytes=None, resume=True, report_every=5.0, report_stream=sys.stderr):
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    writer = open_writer(output, resume)
+    stats = {"generated": 0, "failed": 0, "skipped": 0, "start": time.perf_counter()}
+    last_report = stats["start"]
+
+    def pending_jobs():
+        # Reanudar: omitir lo ya escrito y los ids repetidos en la entrada
+        seen = set()
+        for job in iter_jobs(read_rows(input_path), mode):
+            if job is None:
+                stats["failed"] += 1
+                continue
+            if job[0] in writer.done or job[0] in seen:
+                stats["skipped"] += 1
+                continue
+            seen.add(job[0])
+            yield job
+
+    complete = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(logo_bytes,)) as executor:
+            for row_id, png_bytes, _ in _bounded_map(executor, _generate_job, pending_jobs(), max_in_flight):
+                if png_bytes is None:
+                    stats["failed"] += 1
+                    logger.warning(f"Failed to generate QRGB for row {row_id}")
+                else:
+                    writer.write(row_id, png_bytes)
+                    stats["generated"] += 1
+
+                if report_stream and time.perf_counter() - last_report >= report_every:
+                    _report(stats, workers, report_stream)
+                    last_report = time.perf_counter()
+        complete = True
+    finally:
+        writer.close(complete)
+
+    if report_stream:
+        _report(stats, workers, report_stream)
+    stats["elapsed"] = time.perf_counter() - stats.pop("start")
+    stats["codes_per_second"] = stats["generated"] / max(stats["elapsed"], 1e-9)
+    stats["codes_per_second_per_core"] = stats["codes_per_second"] / workers
+    return stats
+
+# Extensiones de imagen consideradas al decodificar carpetas, patrones o ZIP
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.tif', '.tiff')
+
+def iter_images(source):
+    # Trabajos (contenedor ZIP o None, nombre) a partir de un ZIP, un directorio o un patrón glob
+    if source.lower().endswith(".zip") and os.path.isfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        for name in names:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield source, name
+        return
+
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield None, os.path.join(root, name)
+        return
+
+    for path in sorted(glob.iglob(source, recursive=True)):
+        if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+            yield None, path
+
+# Bytes máximos de cada imagen (archivo o entrada de ZIP, ya descomprimida) antes de leerla: una
+# entrada enorme o una bomba de compresión se rechaza sin ocupar la memoria del worker
+BATCH_MAX_IMAGE_BYTES = int(os.environ.get("QRGB_BATCH_MAX_IMAGE_BYTES", 64 * 1024 * 1024))
+
+# ZIP abiertos por cada proceso del pool (cada worker lee sus propias entradas)
+_worker_archives = {}
+
+def _check_image_size(name, size):
+    if size > BATCH_MAX_IMAGE_BYTES:
+        raise ValueError(f"{name} is {size} bytes, over the {BATCH_MAX_IMAGE_BYTES}-byte limit (QRGB_BATCH_MAX_IMAGE_BYTES)")
+
+def _read_image_bytes(container, name):
+    if container is None:
+        with open(name, "rb") as image_file:
+            _check_image_size(name, os.fstat(image_file.fileno()).st_size)
+            return image_file.read(BATCH_MAX_IMAGE_BYTES + 1)
+    archive = _worker_archives.get(container)
+    if archive is None:
+        archive = _worker_archives[container] = zipfile.ZipFile(container)
+    # zipfile no entrega más bytes que el tamaño declarado en el directorio central
+    info = archive.getinfo(name)
+    _check_image_size(name, info.file_size)
+    return archive.read(info)
+
+def _channel_status(data):
+    if data:
+        return "ok"
+    return "not_found" if data is None else "undecoded"
+
+# Opciones de decodificación de cada proceso del pool (se fijan al crearlo)
+_worker_calibrate = False
+
+def _init_decode_worker(calibrate, profiles_path):
+    global _worker_calibrate
+    _worker_calibrate = calibrate
+    # Perfiles de color por dispositivo (save_profiles) disponibles en cada worker
+    if profiles_path:
+        load_profiles(profiles_path)
+
+def _decode_job(job):
+    # Misma decodificación que la librería (caché, pirámide, calibración y perfiles, rejilla y
+    # respaldo de OpenCV); los tiempos por etapa salen de los temporizadores de qrgb.metrics
+    container, name = job
+    record = {"image": name if container is None else f"{container}!{name}"}
+    with operation("batch_decode") as info:
+        try:
+            with stage("read"):
+                image_bytes = _read_image_bytes(container, name)
+            results, _ = decode_image(image_bytes, calibrate=_worker_calibrate, with_images=False)
+            del image_bytes
+
+            status = {}
+            for key, data in zip(LAYER_KEYS, results):
+                record[key] = data or None
+                status[key] = _channel_status(data)
+            record["status"] = status
+            record["ok"] = all(value == "ok" for value in status.values())
+        except Exception as e:
+            record.update({key: None for key in LAYER_KEYS})
+            record["status"] = {key: "error" for key in LAYER_KEYS}
+            record["ok"] = False
+            record["error"] = str(e)
+    record["cached"] = bool(info.get("cached"))
+    if "size" in info:
+        record["size"] = info["size"]
+    timings = {f"{key}_ms": value for key, value in info.get("stages_ms", {}).items()}
+    if "total_ms" in info:
+        timings["total_ms"] = info["total_ms"]
+    record["timings"] = timings
+    return record
+
+def run_batch_decode(source, output_stream, workers=None, max_in_flight=None,
+                     report_every=5.0, report_stream=sys.stderr, calibrate=False, profiles_path=None):
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+    stats = {"decoded": 0, "failed": 0, "start": time.perf_counter()}
+    last_report = stats["start"]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_decode_worker,
+                             initargs=(calibrate, profiles_path)) as executor:
+        for record in _bounded_map(executor, _decode_job, iter_images(source), max_in_flight):
+            # Un registro JSONL por imagen, escrito en cuanto se termina
+            output_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            stats["decoded" if record["ok"] else "failed"] += 1
+
+            if report_stream and time.perf_counter() - last_report >= report_every:
+                _report_decode(stats, workers, report_stream)
+                last_report = time.perf_counter()
+    output_stream.flush()
+
+    if report_stream:
+        _report_decode(stats, workers, report_stream)
+    stats["elapsed"] = time.perf_counter() - stats.pop("start")
+    stats["images_per_second"] = (stats["decoded"] + stats["failed"]) / max(stats["elapsed"], 1e-9)
+    return stats
+
+def _report_decode(stats, workers, stream):
+    elapsed = max(time.perf_counter() - stats["start"], 1e-9)
+    rate = (stats["decoded"] + stats["failed"]) / elapsed
+    stream.write(
+        f"decoded={stats['decoded']} failed={stats['failed']} elapsed={elapsed:.1f}s "
+        f"rate={rate:.1f} images/s ({rate / workers:.1f} images/s per core)\n"
+    )
+    stream.flush()
@@ -0,0 +1,84 @@
+# Caché LRU en memoria acotada en bytes, segura entre hilos y con estadísticas de aciertos
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, max_bytes, sizeof):
+        # sizeof(valor) -> bytes aproximados que ocupa cada entrada
+        self._entries = OrderedDict()
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+    def _evict(self):
+        # Expulsar las entradas usadas hace más tiempo hasta respetar el límite
+        while self.nbytes > self._max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.nbytes -= size
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+            if size > self._max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        # El valor se calcula fuera del cerrojo; dos hilos pueden calcularlo a la vez, sin efectos
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def items(self):
+        # Copia de las entradas (de la menos a la más usada), sin alterar su orden
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,163 @@
+# Calibración del clasificador de colores: k-means sobre los colores de los módulos, con el
+# blanco y el negro anclados en los patrones fijos (iguales en las tres capas) y el resto de
+# clases asignadas según un modelo lineal de mezcla. Los perfiles se guardan por dispositivo
+# para reutilizarlos en otras fotos
+import itertools
+import json
+import logging
+
+import numpy as np
+
+from .cache import LRUCache
+from .colors import IDEAL_CENTROIDS, build_color_lut
+from .grid import MIN_CHANNEL_CONTRAST, _fixed_modules, candidate_versions, sample_module_grid
+from .metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+KMEANS_ITERATIONS = 20
+KMEANS_ATTEMPTS = 3
+# Fracción central del símbolo que se ignora al calibrar (ahí suele ir el logo)
+LOGO_EXCLUSION = 0.3
+# Perfiles en memoria (~33 KiB cada uno con su tabla)
+PROFILE_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+profile_cache = LRUCache(PROFILE_CACHE_MAX_BYTES, lambda profile: profile["lut"].nbytes + profile["centroids"].nbytes)
+register_cache("color_profile", profile_cache)
+
+def device_key(img):
+    # Identificador del dispositivo según el EXIF (fabricante y modelo) o None
+    try:
+        exif = img.getexif()
+    except Exception:
+        return None
+    key = " ".join(str(exif.get(tag, "")).strip() for tag in (271, 272)).strip()
+    return key or None
+
+# Bits (r, g, b) de cada clase y proyector sobre el complemento del modelo lineal de mezcla
+# color = negro + bits @ M (iluminación y tintas con diafonía entre canales)
+_CLASS_BITS = IDEAL_CENTROIDS / 255
+_MIXING_DESIGN = np.hstack((np.ones((8, 1), dtype=np.float32), _CLASS_BITS))
+_MIXING_INVERSE = np.linalg.pinv(_MIXING_DESIGN)
+_MIXING_RESIDUAL = np.eye(8, dtype=np.float32) - _MIXING_DESIGN @ _MIXING_INVERSE
+# Asignaciones posibles de los 6 grupos intermedios a las clases 1-6
+_PERMUTATIONS = np.array(list(itertools.permutations(range(6))))
+
+def _kmeans(samples, clusters=8, attempts=KMEANS_ATTEMPTS):
+    # k-means++ determinista (varios intentos, se queda el de menor inercia)
+    rng = np.random.default_rng(0)
+    best, best_inertia = None, None
+    for _ in range(attempts):
+        centres = [samples[rng.integers(len(samples))]]
+        for _ in range(clusters - 1):
+            distances = ((samples[:, np.newaxis, :] - np.array(centres)[np.newaxis]) ** 2).sum(axis=-1).min(axis=1)
+            total = distances.sum()
+            if total == 0:
+                break
+            centres.append(samples[rng.choice(len(samples), p=distances / total)])
+        if len(centres) < clusters:
+            return None
+        centres = np.array(centres)
+        for _ in range(KMEANS_ITERATIONS):
+            distances = ((samples[:, np.newaxis, :] - centres[np.newaxis]) ** 2).sum(axis=-1)
+            labels = distances.argmin(axis=1)
+            updated = np.array([
+                samples[labels == index].mean(axis=0) if np.any(labels == index) else centres[index]
+                for index in range(clusters)
+            ])
+            converged = np.allclose(updated, centres, atol=0.5)
+            centres = updated
+            if converged:
+                break
+        inertia = ((samples - centres[labels]) ** 2).sum()
+        if best_inertia is None or inertia < best_inertia:
+            best, best_inertia = centres, inertia
+    return best.astype(np.float32)
+
+def _label_clusters(centres, white, black):
+    # El grupo más cercano al negro de los patrones fijos es la clase 0 y el más cercano al
+    # blanco la 7; los otros 6 se asignan con la permutación que mejor se ajusta al modelo lineal.
+    # El modelo no distingue qué capa es cuál: entre los ajustes equivalentes se elige aquel en
+    # que cada capa enciende sobre todo su propio canal
+    black_index = int(((centres - black) ** 2).sum(axis=1).argmin())
+    white_index = int(((centres - white) ** 2).sum(axis=1).argmin())
+    if black_index == white_index:
+        return None
+    middle = np.array([index for index in range(8) if index not in (black_index, white_index)])
+    ordered = np.empty((len(_PERMUTATIONS), 8, 3), dtype=np.float32)
+    ordered[:, 0] = centres[black_index]
+    ordered[:, 7] = centres[white_index]
+    ordered[:, 1:7] = centres[middle[_PERMUTATIONS]]
+
+    residuals = (np.einsum("ij,pjc->pic", _MIXING_RESIDUAL, ordered) ** 2).sum(axis=(1, 2))
+    mixing = np.einsum("ij,pjc->pic", _MIXING_INVERSE, ordered)
+    own_channel = mixing[:, 1, 0] + mixing[:, 2, 1] + mixing[:, 3, 2]
+    spread = ((centres - centres.mean(axis=0)) ** 2).sum()
+    candidates = residuals <= residuals.min() * 1.1 + 1e-3 * spread
+    return ordered[int(np.where(candidates, own_channel, -np.inf).argmax())]
+
+def calibrate_colors(pixels, corners):
+    # Centroides (8, 3) de las clases QRGB en esta imagen, o None si no se puede calibrar
+    for version in candidate_versions(pixels, corners):
+        colors = sample_module_grid(pixels, corners, version)
+        dark, light = _fixed_modules(version)
+        white = np.median(colors[dark], axis=0)
+        black = np.median(colors[light], axis=0)
+        if np.any(white - black < MIN_CHANNEL_CONTRAST):
+            continue
+
+        # Módulos fuera del centro (logo) como muestras de los 8 colores
+        size = colors.shape[0]
+        index = np.arange(size)
+        outside = np.abs(index + 0.5 - size / 2) > size * LOGO_EXCLUSION / 2
+        samples = colors[outside[:, np.newaxis] | outside[np.newaxis, :]].astype(np.float32)
+
+        centres = _kmeans(samples)
+        centroids = _label_clusters(centres, white, black) if centres is not None else None
+        if centroids is None:
+            # Solo balance de blancos: paleta ideal escalada entre el negro y el blanco medidos
+            centroids = (black + _CLASS_BITS * (white - black)).astype(np.float32)
+        return centroids
+    return None
+
+def make_profile(centroids):
+    centroids = np.asarray(centroids, dtype=np.float32)
+    return {"centroids": centroids, "lut": build_color_lut(centroids)}
+
+def get_profile(device):
+    return profile_cache.get(device) if device else None
+
+def set_profile(device, centroids):
+    profile = make_profile(centroids)
+    profile_cache.put(device, profile)
+    return profile
+
+def resolve_color_lut(pixels, corners, device=None, calibrate=False):
+    # Tabla de clasificación para esta imagen: se calibra si se pide (y se guarda para el
+    # dispositivo) o se reutiliza el perfil del dispositivo. None = umbrales fijos
+    if calibrate and corners is not None:
+        centroids = calibrate_colors(pixels, corners)
+        if centroids is not None:
+            profile = set_profile(device, centroids) if device else make_profile(centroids)
+            return profile["lut"]
+    profile = get_profile(device)
+    return profile["lut"] if profile else None
+
+def save_profiles(path):
+    # Perfiles de dispositivo en JSON ({dispositivo: centroides 8x3})
+    data = {device: profile["centroids"].round(2).tolist() for device, profile in profile_cache.items()}
+    with open(path, "w", encoding="utf-8") as profile_file:
+        json.dump(data, profile_file, indent=2, ensure_ascii=False)
+        profile_file.write("\n")
+    return len(data)
+
+def load_profiles(path):
+    try:
+        with open(path, encoding="utf-8") as profile_file:
+            data = json.load(profile_file)
+        for device, centroids in data.items():
+            set_profile(device, centroids)
+        return len(data)
+    except Exception as e:
+        logger.error(f"Error loading calibration profiles from {path}: {str(e)}")
+        return 0
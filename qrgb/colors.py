@@ -0,0 +1,48 @@
+# Clasificación de colores QRGB con una tabla 3D precalculada: cada color RGB (cuantizado a
+# LUT_BINS niveles por canal) se asigna a una de las 8 clases (r << 2) | (g << 1) | b, donde
+# cada bit indica que esa capa tiene un módulo oscuro (canal encendido)
+import numpy as np
+
+LUT_BINS = 32
+_SHIFT = 8 - int(np.log2(LUT_BINS))
+
+# Colores ideales de las 8 clases, en el orden del índice de clase
+IDEAL_CENTROIDS = np.array(
+    [[255 * ((index >> shift) & 1) for shift in (2, 1, 0)] for index in range(8)], dtype=np.float32
+)
+
+def _bin_centres():
+    # Centro de cada celda de la tabla como color RGB (LUT_BINS^3, 3)
+    centres = (np.arange(LUT_BINS, dtype=np.float32) + 0.5) * (256 / LUT_BINS)
+    r, g, b = np.meshgrid(centres, centres, centres, indexing="ij")
+    return np.stack((r, g, b), axis=-1).reshape(-1, 3)
+
+_BIN_CENTRES = _bin_centres()
+
+def build_color_lut(centroids):
+    # Clase del centroide más cercano para cada celda: tabla (LUT_BINS, LUT_BINS, LUT_BINS) uint8
+    centroids = np.asarray(centroids, dtype=np.float32)
+    # |x - c|^2 = |x|^2 - 2 x·c + |c|^2; |x|^2 no cambia el argmin
+    distances = (centroids ** 2).sum(axis=1) - 2 * (_BIN_CENTRES @ centroids.T)
+    lut = distances.argmin(axis=1).astype(np.uint8).reshape((LUT_BINS,) * 3)
+    lut.flags.writeable = False
+    return lut
+
+def classify_pixels(pixels, lut):
+    # Clase (alto, ancho) de cada píxel con una sola indexación de la tabla aplanada
+    if pixels.dtype != np.uint8:
+        pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+    bits = 8 - _SHIFT
+    index = (pixels[..., 0] >> _SHIFT).astype(np.uint16) << (2 * bits)
+    index |= (pixels[..., 1] >> _SHIFT).astype(np.uint16) << bits
+    index |= pixels[..., 2] >> _SHIFT
+    return lut.ravel().take(index)
+
+def class_planes(classes):
+    # Planos blanco y negro por capa (0 = módulo oscuro, 255 = claro), como split_qrgb_channels
+    planes = []
+    for shift in (2, 1, 0):
+        plane = np.equal(np.bitwise_and(classes, 1 << shift), 0).view(np.uint8)
+        plane *= 255
+        planes.append(plane)
+    return tuple(planes)
@@ -0,0 +1,455 @@
+# Decodificación QRGB: separación de canales y lectura de cada capa con OpenCV
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from .cache import LRUCache
+from .calibration import device_key, resolve_color_lut
+from .colors import class_planes, classify_pixels
+from .encode import PREVIEW_SIZE, encode_png, fit_nearest
+from .grid import decode_module_grid
+from .metrics import increment, observe, operation, register_cache, stage
+from .utils import as_bytes
+
+logger = logging.getLogger(__name__)
+
+# Umbral por canal a partir del cual una capa se considera presente
+CHANNEL_THRESHOLD = 100
+
+def rgb_pixels(img):
+    # Vista (alto, ancho, 3) uint8 de la imagen; el alfa se ignora igual que antes
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.asarray(img)
+
+# Límite de píxeles de una imagen a decodificar (memoria de cada worker): las JPEG mayores se
+# decodifican ya reducidas y el resto se rechaza
+DECODE_MAX_PIXELS = int(os.environ.get("QRGB_DECODE_MAX_PIXELS", 24_000_000))
+# Lado mayor mínimo del primer nivel de la pirámide de resoluciones
+PYRAMID_MIN_SIDE = 800
+
+def _jpeg_reduction(width, height, max_pixels):
+    # Menor reducción de draft (1, 2, 4 u 8) que deja la JPEG dentro del límite
+    for factor in (1, 2, 4, 8):
+        if (width // factor) * (height // factor) <= max_pixels:
+            return factor
+    return 8
+
+def load_pixels(img, max_pixels=DECODE_MAX_PIXELS):
+    # Como rgb_pixels, pero sin superar max_pixels. En JPEG, draft decodifica directamente a
+    # 1/2, 1/4 u 1/8 de la resolución (escalado en la DCT) sin cargar la imagen completa
+    width, height = img.size
+    if width * height > max_pixels and img.format == "JPEG":
+        factor = _jpeg_reduction(width, height, max_pixels)
+        img.draft("RGB", (width // factor, height // factor))
+        width, height = img.size
+    if width * height > max_pixels:
+        raise ValueError(f"Image too large to decode: {width}x{height} pixels (limit {max_pixels})")
+    return rgb_pixels(img)
+
+def image_pyramid(image_bytes, max_pixels=DECODE_MAX_PIXELS, min_side=PYRAMID_MIN_SIDE):
+    # Niveles de menor a mayor resolución (mitades sucesivas), generados bajo demanda: el primero
+    # tiene un lado mayor de al menos min_side y el último es la imagen completa (dentro del
+    # límite de píxeles). El símbolo suele leerse en el primero y los siguientes no se calculan.
+    # Las JPEG se decodifican a cada escala con draft; el resto se reduce desde la imagen completa
+    import cv2
+    
+    pixels = None
+    with stage("load"), Image.open(BytesIO(image_bytes)) as img:
+        width, height = img.size
+        jpeg = img.format == "JPEG"
+        if jpeg:
+            reduction = _jpeg_reduction(width, height, max_pixels)
+            width, height = width // reduction, height // reduction
+        else:
+            pixels = load_pixels(img, max_pixels)
+    observe("qrgb_decode_input_pixels", width * height)
+    
+    factor = 1
+    while max(width, height) // (factor * 2) >= min_side:
+        factor *= 2
+    while factor > 1:
+        size = (width // factor, height // factor)
+        with stage("load"):
+            if jpeg:
+                with Image.open(BytesIO(image_bytes)) as img:
+                    img.draft("RGB", size)
+                    level = rgb_pixels(img)
+                if level.shape[1] != size[0] or level.shape[0] != size[1]:
+                    level = cv2.resize(level, size, interpolation=cv2.INTER_AREA)
+            else:
+                level = cv2.resize(pixels, size, interpolation=cv2.INTER_AREA)
+        yield level
+        factor //= 2
+    
+    if jpeg:
+        with stage("load"), Image.open(BytesIO(image_bytes)) as img:
+            pixels = load_pixels(img, max_pixels)
+    yield pixels
+
+def split_qrgb_channels(img, threshold=CHANNEL_THRESHOLD, lut=None):
+    # Acepta una imagen PIL o los píxeles RGB ya extraídos con rgb_pixels
+    pixels = img if isinstance(img, np.ndarray) else rgb_pixels(img)
+    
+    with stage("split"):
+        # Con una tabla de colores (calibrada) se clasifica cada píxel en una de las 8 clases
+        if lut is not None:
+            return class_planes(classify_pixels(pixels, lut))
+        
+        # Sin tabla, umbral fijo por canal: tres comparaciones son exactas y más rápidas que la tabla
+        # cuantizada. Cada canal produce un plano de 1 byte: 0 (negro) si supera el umbral, 255 (blanco) si no
+        planes = []
+        for channel in range(3):
+            plane = np.less_equal(pixels[..., channel], threshold).view(np.uint8)
+            plane *= 255
+            planes.append(plane)
+        return tuple(planes)
+
+# Detectores reutilizables: uno por hilo, ya que QRCodeDetector no debe compartirse entre hilos
+_detector_local = threading.local()
+
+def _get_qr_detector():
+    import cv2
+    
+    detector = getattr(_detector_local, "detector", None)
+    if detector is None:
+        detector = cv2.QRCodeDetector()
+        _detector_local.detector = detector
+    return detector
+
+# Pool compartido para decodificar canales; OpenCV libera el GIL en detectAndDecode
+DECODE_WORKERS = max(3, os.cpu_count() or 1)
+_decode_executor = None
+_decode_executor_lock = threading.Lock()
+
+def _get_decode_executor():
+    global _decode_executor
+    with _decode_executor_lock:
+        if _decode_executor is None:
+            _decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="qrgb-decode")
+        return _decode_executor
+
+def decode_channels(planes, fail_fast=False, corners=None):
+    # Decodificar cada plano en paralelo; por defecto se esperan todos los canales, así que el
+    # resultado es el mismo que decodificándolos en secuencia. Con fail_fast se abandonan los
+    # pendientes al primer fallo: qué canales llegan a leerse depende entonces del orden en que
+    # terminen los hilos (solo para quien únicamente necesita saber si las tres capas se leen).
+    # Con corners (esquinas ya conocidas) se omite la detección y solo se decodifica
+    executor = _get_decode_executor()
+    if corners is None:
+        futures = {executor.submit(read_qr, plane): index for index, plane in enumerate(planes)}
+    else:
+        futures = {executor.submit(decode_plane_at, plane, corners): index for index, plane in enumerate(planes)}
+    results = [None] * len(planes)
+    
+    for future in as_completed(futures):
+        data = future.result()
+        results[futures[future]] = data
+        if fail_fast and not data:
+            for pending in futures:
+                pending.cancel()
+            break
+    
+    return tuple(results)
+
+def decode_plane_at(plane, corners):
+    # Decodificar un plano cuyas esquinas ya se conocen (sin volver a detectar el símbolo)
+    try:
+        with stage("opencv_decode"):
+            data, _ = _get_qr_detector().decode(plane, corners)
+        return data or None
+    except Exception as e:
+        logger.error(f"Error decoding rectified QR code: {str(e)}")
+        return None
+
+# Lado máximo del cuadrado canónico: ~6 píxeles por módulo incluso en la versión 40
+RECTIFIED_MAX_SIDE = 1024
+
+def locate_symbol(planes):
+    # Localizar el símbolo una sola vez. En los planos un módulo oscuro vale 0 y los patrones de
+    # búsqueda son comunes a las tres capas: primero se prueba la unión de los módulos oscuros
+    # (resiste capas desvaídas), luego su intersección (resiste capas manchadas) y, por último,
+    # cada plano. Devuelve las 4 esquinas (float32, sentido horario desde arriba a la izquierda) o None
+    detector = _get_qr_detector()
+    
+    def combined(reduce):
+        image = reduce(planes[0], planes[1])
+        return reduce(image, planes[2], out=image)
+    
+    candidates = (
+        lambda: combined(np.minimum),
+        lambda: combined(np.maximum),
+        *(lambda plane=plane: plane for plane in planes),
+    )
+    with stage("locate"):
+        for candidate in candidates:
+            found, points = detector.detect(candidate())
+            if found and points is not None:
+                return points.reshape(4, 2).astype(np.float32)
+    increment("qrgb_locate_failures_total")
+    return None
+
+def rectify_symbol(planes, corners, max_side=RECTIFIED_MAX_SIDE):
+    # Una sola homografía lleva el símbolo de los tres planos a un cuadrado canónico con margen
+    # claro (zona de silencio). Devuelve los planos rectificados y las esquinas del símbolo en ellos
+    import cv2
+    
+    side = int(max(np.linalg.norm(corners[i] - corners[(i + 1) % 4]) for i in range(4)))
+    side = min(side, max_side)
+    margin = max(side // 8, 8)
+    canonical = np.float32([[margin, margin], [margin + side, margin], [margin + side, margin + side], [margin, margin + side]])
+    homography = cv2.getPerspectiveTransform(corners, canonical)
+    size = side + 2 * margin
+    
+    rectified = []
+    with stage("rectify"):
+        for plane in planes:
+            warped = cv2.warpPerspective(plane, homography, (size, size), flags=cv2.INTER_LINEAR, borderValue=255)
+            # Volver a binarizar tras la interpolación
+            cv2.threshold(warped, 127, 255, cv2.THRESH_BINARY, dst=warped)
+            rectified.append(warped)
+    return tuple(rectified), canonical.reshape(1, 4, 2)
+
+# auto: rejilla de módulos y, para las capas que falten, OpenCV; grid / opencv: solo una de las dos
+DECODE_METHODS = ("auto", "grid", "opencv")
+
+def _count_layers(previous, found, path):
+    # Capas leídas por primera vez en una ruta de decodificación (rejilla, rectificada, detección)
+    increment("qrgb_decode_layers_total", sum(1 for old, new in zip(previous, found) if new and not old), path=path)
+
+def decode_superposed(planes, pixels=None, method="auto", corners=None, lut=None, known=None):
+    # Ruta compartida: detección única y decodificación de los tres canales sobre la misma
+    # geometría, primero muestreando la rejilla de módulos (necesita los píxeles RGB) y después
+    # con OpenCV sobre los planos rectificados. Lo que quede pasa por la detección individual.
+    # known: capas ya leídas (p. ej. en otra escala), que no se vuelven a intentar con OpenCV
+    if method not in DECODE_METHODS:
+        raise ValueError(f"Unknown decode method: {method}")
+    
+    results = tuple(known) if known is not None else (None, None, None)
+    try:
+        if corners is None:
+            corners = locate_symbol(planes)
+        if corners is not None and pixels is not None and method != "opencv":
+            with stage("grid"):
+                grid = decode_module_grid(pixels, corners, lut)
+                if lut is not None and not all(grid):
+                    # La calibración no siempre acierta: completar con los umbrales de los patrones fijos
+                    plain = decode_module_grid(pixels, corners)
+                    grid = tuple(data or other for data, other in zip(grid, plain))
+            _count_layers(results, grid, "grid")
+            results = tuple(data or other for data, other in zip(results, grid))
+    except Exception as e:
+        logger.error(f"Error in shared QRGB decode: {str(e)}")
+    if method == "grid":
+        return results
+    
+    missing = [index for index, data in enumerate(results) if not data]
+    if missing and corners is not None:
+        try:
+            rectified, canonical = rectify_symbol([planes[index] for index in missing], corners)
+            results = list(results)
+            for index, data in zip(missing, decode_channels(rectified, corners=canonical)):
+                results[index] = data
+                increment("qrgb_decode_layers_total", int(bool(data)), path="rectified")
+            missing = [index for index, data in enumerate(results) if not data]
+        except Exception as e:
+            logger.error(f"Error in shared QRGB decode: {str(e)}")
+    if not missing:
+        return tuple(results)
+    
+    results = list(results)
+    fallback = decode_channels([planes[index] for index in missing])
+    for index, data in zip(missing, fallback):
+        results[index] = data
+        increment("qrgb_decode_layers_total", int(bool(data)), path="detect")
+    return tuple(results)
+
+# Caché de resultados de decodificación compartida por todas las sesiones del proceso, acotada en
+# bytes. La clave es el hash de los bytes subidos y, opcionalmente, el de los píxeles del primer
+# nivel de la pirámide (una copia recodificada sin pérdidas, p. ej. otro PNG o sin metadatos,
+# también coincide). Solo se guardan decodificaciones completas: los datos leídos son válidos sea
+# cual sea el perfil de color, y una foto fallida se vuelve a intentar (p. ej. tras calibrar)
+DECODE_CACHE_MAX_BYTES = int(os.environ.get("QRGB_DECODE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+DECODE_CACHE_PIXEL_KEYS = os.environ.get("QRGB_DECODE_CACHE_PIXELS", "1") != "0"
+
+def _decode_entry_nbytes(entry):
+    payloads, images = entry
+    size = sum(len(data.encode("utf-8")) for data in payloads)
+    if images is not None:
+        size += sum(img.size[0] * img.size[1] * len(img.getbands()) for img in images)
+    return size
+
+decode_cache = LRUCache(DECODE_CACHE_MAX_BYTES, _decode_entry_nbytes)
+register_cache("decode", decode_cache)
+
+def image_digest(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def pixels_digest(pixels):
+    # Hash de los píxeles decodificados (con sus dimensiones), independiente del formato del archivo
+    digest = hashlib.sha256(np.int64(pixels.shape).tobytes())
+    digest.update(np.ascontiguousarray(pixels))
+    return "pixels:" + digest.hexdigest()
+
+def decode_cache_key(digest, method="auto", calibrate=False, preview_size=None):
+    return digest, method, calibrate, preview_size
+
+def lookup_decode(key, kind="bytes", with_images=True):
+    # ((rojo, verde, azul), imágenes de los canales) o None; las imágenes son compartidas entre
+    # sesiones y no deben modificarse
+    entry = decode_cache.get(key) if decode_cache.max_bytes > 0 else None
+    if entry is not None and with_images and entry[1] is None:
+        entry = None
+    increment("qrgb_decode_cache_lookups_total", key=kind, result="miss" if entry is None else "hit")
+    return entry
+
+def remember_decode(keys, results, images=None):
+    # Guardar una decodificación completa bajo todas sus claves (bytes y píxeles)
+    if not all(results) or decode_cache.max_bytes <= 0:
+        return
+    entry = (tuple(results), images)
+    for key in keys:
+        if key is not None:
+            decode_cache.put(key, entry)
+
+def image_preview(image_bytes, size=PREVIEW_SIZE):
+    # Miniatura de la imagen subida (PNG, o JPEG si era una foto); las JPEG se decodifican ya reducidas
+    with Image.open(BytesIO(as_bytes(image_bytes))) as img:
+        jpeg = img.format == "JPEG"
+        img.draft("RGB", (size, size))
+        img = img.convert("RGB") if img.mode not in ("RGB", "P", "L") else img
+        img.thumbnail((size, size), Image.NEAREST)
+        if not jpeg:
+            return encode_png(img)
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
+
+def decode_image(image_bytes, method="auto", calibrate=False, device=None, preview_size=None, with_images=True):
+    # Núcleo de la decodificación, compartido por manual_decode_superposed_qr y los lotes; las
+    # excepciones se propagan. Devuelve ((rojo, verde, azul), imágenes de los canales o None).
+    # Con preview_size, las imágenes de los canales son miniaturas (vecino más cercano) de ese lado
+    # como máximo; sin with_images no se crean y la caché solo guarda los datos
+    with operation("decode", method=method, calibrate=calibrate) as record:
+        observe("qrgb_decode_input_bytes", len(image_bytes))
+        
+        # Misma imagen subida de nuevo (en esta u otra sesión): resultado de la caché
+        use_cache = decode_cache.max_bytes > 0
+        key = pixel_key = None
+        if use_cache:
+            with stage("cache_lookup"):
+                key = decode_cache_key(image_digest(image_bytes), method, calibrate, preview_size)
+                cached = lookup_decode(key, with_images=with_images)
+            if cached is not None:
+                record["cached"] = "bytes"
+                return cached
+        
+        if device is None:
+            with Image.open(BytesIO(image_bytes)) as superposed_img:
+                device = device_key(superposed_img)
+        
+        # Pirámide de resoluciones: cada escala solo intenta las capas que aún no se han leído
+        results = (None, None, None)
+        lut = None
+        calibrating = calibrate or bool(device)
+        for level in image_pyramid(image_bytes):
+            record["levels"] = record.get("levels", 0) + 1
+            
+            # Copia recodificada de una imagen ya leída: mismos píxeles en el primer nivel
+            if use_cache and DECODE_CACHE_PIXEL_KEYS and pixel_key is None:
+                with stage("cache_lookup"):
+                    pixel_key = decode_cache_key(pixels_digest(level), method, calibrate, preview_size)
+                    cached = lookup_decode(pixel_key, "pixels", with_images)
+                if cached is not None:
+                    record["cached"] = "pixels"
+                    remember_decode([key], *cached)
+                    return cached
+            
+            planes = split_qrgb_channels(level)
+            
+            # Calibración de colores (o perfil ya calibrado del dispositivo) en lugar de umbrales
+            # fijos; la tabla no depende de la escala y se resuelve en la primera que localiza el símbolo
+            corners = None
+            if calibrating:
+                corners = locate_symbol(planes)
+                if corners is not None:
+                    with stage("calibrate"):
+                        lut = resolve_color_lut(level, corners, device, calibrate)
+                    calibrating = False
+            if lut is not None:
+                planes = split_qrgb_channels(level, lut=lut)
+            
+            # Localizar una vez y leer la rejilla de módulos; OpenCV solo para las capas que falten
+            results = decode_superposed(planes, level, method, corners, lut, results)
+            record["size"] = f"{level.shape[1]}x{level.shape[0]}"
+            if all(results):
+                break
+        
+        # Crear imágenes separadas para cada canal (sin copiar los planos) en la última escala usada
+        images = None
+        if with_images:
+            images = tuple(Image.fromarray(plane) for plane in planes)
+            if preview_size:
+                images = tuple(fit_nearest(img, preview_size) for img in images)
+        for channel, data in zip(("red", "green", "blue"), results):
+            increment("qrgb_decode_channels_total", channel=channel, result="ok" if data else "failed")
+        record["decoded"] = [bool(data) for data in results]
+        remember_decode([key, pixel_key], results, images)
+        
+        return tuple(results), images
+
+def manual_decode_superposed_qr(uploaded_file, method="auto", calibrate=False, device=None, preview_size=None):
+    # Con preview_size, las imágenes de los canales son miniaturas (vecino más cercano) de ese lado
+    # como máximo
+    try:
+        # Abrir la imagen directamente desde los bytes subidos (sin archivos temporales)
+        (data_red, data_green, data_blue), images = decode_image(
+            as_bytes(uploaded_file), method, calibrate, device, preview_size
+        )
+        return data_red, data_green, data_blue, images
+    
+    except Exception as e:
+        logger.error(f"Error in manual_decode_superposed_qr: {str(e)}")
+        return None, None, None, None
+
+def read_qr(source):
+    # OpenCV se importa de forma diferida para que el paquete arranque rápido
+    import cv2
+    
+    try:
+        # Aceptar un array de NumPy ya en memoria o, por compatibilidad, una ruta de archivo
+        if isinstance(source, np.ndarray):
+            img = source
+        else:
+            img = cv2.imread(source)
+            if img is None:
+                logger.error(f"Failed to read image: {source}")
+                return None
+        
+        # Intentar decodificar con diferentes métodos para mayor robustez
+        detector = _get_qr_detector()
+        with stage("read_qr"):
+            data, vertices_array, _ = detector.detectAndDecode(img)
+        
+        if vertices_array is not None:
+            return data
+        
+        # Si falló el primer intento, probar con preprocesamiento
+        with stage("read_qr_threshold"):
+            gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
+            
+            data, vertices_array, _ = detector.detectAndDecode(thresh)
+        increment("qrgb_read_qr_threshold_fallback_total", result="ok" if vertices_array is not None else "failed")
+        
+        return data if vertices_array is not None else None
+        
+    except Exception as e:
+        logger.error(f"Error reading QR code: {str(e)}")
+        return None
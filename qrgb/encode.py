@@ -0,0 +1,312 @@
+# Codificación QRGB: capas QR, composición a resolución de módulo y rasterizado
+import logging
+import zlib
+from io import BytesIO
+
+import numpy as np
+import qrcode
+from PIL import Image
+
+from .layout import minimal_version, plan_error_correction, plan_qr_layout
+from .logo import _paste_logo, logo_digest
+from .matrix import cached_qr_matrix
+from .metrics import observe, operation, stage
+from .store import result_key, result_store
+
+logger = logging.getLogger(__name__)
+
+# Funciones de QR mejoradas para mayor rendimiento y fiabilidad
+def create_qr(data, color, qr_version=10, box_size=10):
+    # Validar datos de entrada
+    if not data:
+        return None
+    
+    try:
+        qr = qrcode.QRCode(
+            version=qr_version,
+            error_correction=qrcode.constants.ERROR_CORRECT_H,
+            box_size=box_size,
+            border=4
+        )
+        with stage("qr_make"):
+            qr.add_data(data)
+            qr.make(fit=True)
+        
+        # Mapeo de colores
+        color_map = {
+            "red": (255, 0, 0),
+            "green": (0, 255, 0),
+            "blue": (0, 0, 255),
+            "black": (0, 0, 0)
+        }
+        
+        # Usar color en formato RGB si está en el mapa, o usar el color directamente
+        fill_color = color_map.get(color, color)
+        
+        with stage("qr_image"):
+            img = qr.make_image(fill_color=fill_color, back_color="white").convert('RGBA')
+        return img
+    except Exception as e:
+        logger.error(f"Error creating QR code: {str(e)}")
+        return None
+
+def create_qr_with_logo(data, color, logo_file=None, qr_version=10, box_size=10):
+    img = create_qr(data, color, qr_version, box_size)
+    if img is None:
+        return None
+    
+    if logo_file is not None:
+        try:
+            with stage("logo"):
+                _paste_logo(img, logo_file)
+        except Exception as e:
+            logger.error(f"Error adding logo to QR: {str(e)}")
+    
+    return img
+
+# Paleta QRGB indexada por (rojo << 2) | (verde << 1) | azul
+QRGB_PALETTE = np.array([
+    (0, 0, 0, 255),        # ninguna capa
+    (0, 0, 255, 255),      # azul
+    (0, 255, 0, 255),      # verde
+    (0, 255, 255, 255),    # verde + azul
+    (255, 0, 0, 255),      # rojo
+    (255, 0, 255, 255),    # rojo + azul
+    (255, 255, 0, 255),    # rojo + verde
+    (255, 255, 255, 255),  # las tres capas
+], dtype=np.uint8)
+
+# Paleta RGB de las imágenes indexadas ("P") y vista de 32 bits del alfa para las máscaras
+_QRGB_PALETTE_BYTES = QRGB_PALETTE[:, :3].tobytes()
+_ALPHA_BITS_32 = np.array([0, 0, 0, 255], dtype=np.uint8).view(np.uint32)[0]
+
+# Opciones de PNG: la estrategia RLE de zlib aprovecha los tramos de módulos y es varias veces
+# más rápida que la predeterminada con un tamaño similar
+PNG_SAVE_OPTIONS = {"compress_level": 6, "compress_type": zlib.Z_RLE}
+
+def _dark_mask(img):
+    # Un píxel es "oscuro" si su color RGB no es blanco puro (se ignora el alfa)
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    pixels = np.asarray(img).view(np.uint32)[..., 0]
+    return (pixels | _ALPHA_BITS_32) != 0xFFFFFFFF
+
+def compose_color_index(red_mask, green_mask, blue_mask):
+    # Índice de color de 3 bits (rojo, verde, azul) a partir de tres máscaras booleanas
+    color_index = red_mask.astype(np.uint8) << 2
+    color_index |= green_mask.view(np.uint8) << 1
+    color_index |= blue_mask.view(np.uint8)
+    return color_index
+
+def _palette_image(color_index, palette=_QRGB_PALETTE_BYTES):
+    # Imagen indexada ("P") sobre el propio índice de color, sin expandirlo a RGBA: 1 byte por
+    # píxel en memoria y 4 bits por píxel en el PNG
+    color_index = np.ascontiguousarray(color_index, dtype=np.uint8)
+    img = Image.frombuffer("P", color_index.shape[::-1], color_index, "raw", "P", 0, 1)
+    img.putpalette(palette)
+    return img
+
+def _paste_logo_rgb(img, logo_file):
+    # El logo tiene colores fuera de la paleta: la imagen pasa a RGB antes de pegarlo
+    with stage("logo"):
+        img = img.convert("RGB")
+        _paste_logo(img, logo_file)
+    return img
+
+# Lado máximo de las miniaturas de la interfaz (el doble de los 150 px mostrados, para pantallas
+# de alta densidad)
+PREVIEW_SIZE = 300
+
+def fit_nearest(img, size=PREVIEW_SIZE):
+    # Miniatura por vecino más cercano que cabe en size x size (colores exactos, sin suavizado)
+    scale = size / max(img.size)
+    if scale >= 1:
+        return img
+    return img.resize((max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale))), Image.NEAREST)
+
+def encode_png(img):
+    # Codificación PNG única del pipeline (guardar, vista previa y descarga reutilizan los bytes)
+    with stage("png_encode"):
+        buf = BytesIO()
+        img.save(buf, format="PNG", **PNG_SAVE_OPTIONS)
+    observe("qrgb_png_bytes", buf.tell())
+    return buf.getvalue()
+
+def combine_qr_images(img1, img2, img3, logo_file=None):
+    # Verificar que todas las imágenes son válidas
+    if any(img is None for img in [img1, img2, img3]):
+        logger.error("One or more QR images are invalid")
+        return None
+    
+    try:
+        # Asegurar que todas las imágenes tengan el mismo tamaño
+        size = img1.size
+        if img2.size != size:
+            img2 = img2.resize(size, Image.LANCZOS)
+        if img3.size != size:
+            img3 = img3.resize(size, Image.LANCZOS)
+        
+        # Máscaras booleanas de módulos "oscuros" (cualquier píxel no blanco) por capa
+        with stage("combine"):
+            color_index = compose_color_index(_dark_mask(img1), _dark_mask(img2), _dark_mask(img3))
+            
+            # Crear imagen final
+            final_image = _palette_image(color_index)
+        
+        # Añadir logo si se proporciona
+        if logo_file is not None:
+            try:
+                final_image = _paste_logo_rgb(final_image, logo_file)
+            except Exception as e:
+                logger.error(f"Error adding logo to combined QR: {str(e)}")
+        
+        return final_image
+    
+    except Exception as e:
+        logger.error(f"Error combining QR images: {str(e)}")
+        return None
+
+# Zona de silencio alrededor del símbolo, en módulos
+QR_BORDER = 4
+
+# Nivel mínimo de corrección de errores: H con logo (tapa el centro del símbolo), Q sin logo
+MIN_ERROR_CORRECTION_LOGO = qrcode.constants.ERROR_CORRECT_H
+MIN_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_Q
+
+def create_layer_matrices(red_data, green_data, blue_data, qr_version=None, error_correction=None,
+                          min_error_correction=qrcode.constants.ERROR_CORRECT_H):
+    # Validar datos de entrada
+    if not all([red_data, green_data, blue_data]):
+        return None
+    
+    try:
+        payloads = (red_data, green_data, blue_data)
+        
+        # Las tres capas comparten una única rejilla: versión y nivel de corrección comunes,
+        # planificados para el conjunto en lugar de ajustarse por capa. Lo que fije el llamante
+        # se respeta (ERROR_CORRECT_M vale 0: se comprueba con "is None")
+        if qr_version is None and error_correction is None:
+            qr_version, error_correction = plan_qr_layout(payloads, min_error_correction)
+        elif qr_version is None:
+            qr_version = minimal_version(payloads, error_correction)
+        elif error_correction is None:
+            error_correction = plan_error_correction(payloads, qr_version, min_error_correction)
+        
+        return tuple(cached_qr_matrix(data, qr_version, error_correction) for data in payloads)
+    except Exception as e:
+        logger.error(f"Error creating QR matrices: {str(e)}")
+        return None
+
+def render_color_index(color_index, box_size=10, border=QR_BORDER):
+    # Añadir la zona de silencio (ninguna capa -> negro) y escalar por un entero
+    padded = np.pad(color_index, border)
+    scaled = padded.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    return _palette_image(scaled)
+
+# Colores de cada capa individual sobre fondo blanco
+LAYER_COLORS = {
+    "red": (255, 0, 0, 255),
+    "green": (0, 255, 0, 255),
+    "blue": (0, 0, 255, 255),
+}
+
+def render_layer(matrix, color, box_size=10, border=QR_BORDER):
+    # Rasterizar una capa (módulo oscuro -> color de la capa, claro -> blanco)
+    padded = np.pad(matrix, border)
+    scaled = padded.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    palette = bytes((255, 255, 255)) + bytes(LAYER_COLORS[color][:3])
+    return _palette_image(scaled.view(np.uint8), palette)
+
+def detect_mode(red_data, green_data, blue_data):
+    # 'link' si alguna capa contiene una URL, 'text' en caso contrario
+    return 'link' if any('http' in text.lower() for text in [red_data, green_data, blue_data]) else 'text'
+
+def generate_qrgb_bundle(red_data, green_data, blue_data, logo_file=None, mode='link', with_layers=True, save=True,
+                         preview_size=None):
+    # Pipeline único: devuelve (capas, imagen combinada, bytes PNG) a partir de las mismas matrices.
+    # Los procesos por lotes pueden omitir las vistas previas (capas = None) y el almacén en disco.
+    # Con save, el PNG se busca primero en el almacén de resultados y se guarda en él si no estaba.
+    # Con preview_size, capas y combinada son miniaturas de ese lado como máximo, con un número
+    # entero de píxeles por módulo; los bytes PNG siguen siendo la imagen completa
+    with operation("generate", mode=mode, logo=logo_file is not None):
+        try:
+            # El modo solo determina el tamaño de módulo; la versión se planifica según los datos
+            box_size = 10 if mode == 'link' else 20
+            min_error_correction = MIN_ERROR_CORRECTION_LOGO if logo_file is not None else MIN_ERROR_CORRECTION
+            payloads = (red_data, green_data, blue_data)
+            if not all(payloads):
+                logger.error("Failed to generate combined QR image")
+                return None
+            
+            # La versión y el nivel de corrección se planifican antes de generar nada: junto con los
+            # datos, el tamaño de módulo y el logo forman la clave del almacén de resultados
+            qr_version, error_correction = plan_qr_layout(payloads, min_error_correction)
+            modules = qr_version * 4 + 17 + 2 * QR_BORDER
+            key = None
+            png_bytes = None
+            if save and result_store.enabled:
+                with stage("store_lookup"):
+                    digest = logo_digest(logo_file) if logo_file is not None else None
+                    key = result_key(payloads, qr_version, error_correction, box_size, QR_BORDER, digest)
+                    png_bytes = result_store.get(key)
+            
+            # Generar las matrices de módulos de cada capa (solo para las vistas previas si el PNG
+            # ya estaba en el almacén)
+            matrices = None
+            if png_bytes is None or with_layers:
+                with stage("matrices"):
+                    matrices = create_layer_matrices(*payloads, qr_version, error_correction)
+                if matrices is None:
+                    logger.error("Failed to generate combined QR image")
+                    return None
+            
+            if png_bytes is None:
+                # Componer a resolución de módulo y rasterizar una única vez
+                with stage("compose"):
+                    combined_img = render_color_index(compose_color_index(*matrices), box_size)
+                
+                # Añadir logo si se proporciona
+                if logo_file is not None:
+                    try:
+                        combined_img = _paste_logo_rgb(combined_img, logo_file)
+                    except Exception as e:
+                        logger.error(f"Error adding logo to combined QR: {str(e)}")
+                
+                # Codificar el PNG una sola vez y reutilizar los bytes para guardar, mostrar y descargar
+                png_bytes = encode_png(combined_img)
+                
+                # Guardar en el almacén (escritura atómica, compartida entre procesos)
+                if key is not None:
+                    with stage("save"):
+                        result_store.put(key, png_bytes)
+            else:
+                # Acierto: la imagen combinada se lee del PNG guardado en lugar de rasterizarla
+                with stage("store_load"):
+                    combined_img = Image.open(BytesIO(png_bytes))
+                    combined_img.load()
+            
+            # Miniaturas directamente desde la rejilla de módulos (la combinada, desde la imagen compuesta)
+            with stage("previews"):
+                preview_box_size = box_size
+                if preview_size:
+                    preview_box_size = max(1, min(box_size, preview_size // modules))
+                    if preview_box_size != box_size:
+                        combined_img = combined_img.resize((modules * preview_box_size,) * 2, Image.NEAREST)
+                
+                # Vistas previas de las capas con la misma versión y tamaño que la combinada
+                layers = None
+                if with_layers:
+                    layers = tuple(
+                        render_layer(matrix, color, preview_box_size)
+                        for matrix, color in zip(matrices, ("red", "green", "blue"))
+                    )
+            
+            return layers, combined_img, png_bytes
+        
+        except Exception as e:
+            logger.error(f"Error in generate_qrgb: {str(e)}")
+            return None
+
+def generate_qrgb(red_data, green_data, blue_data, logo_file=None, mode='link'):
+    bundle = generate_qrgb_bundle(red_data, green_data, blue_data, logo_file, mode)
+    return bundle[1] if bundle else None
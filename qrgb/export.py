@@ -0,0 +1,188 @@
+# Salida para impresión: PNG en streaming (fila a fila desde la rejilla de módulos, memoria
+# independiente del tamaño de salida) y escritores vectoriales SVG/PDF cuyo coste depende solo
+# del número de módulos
+import logging
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .encode import MIN_ERROR_CORRECTION, QR_BORDER, QRGB_PALETTE, compose_color_index, create_layer_matrices
+
+logger = logging.getLogger(__name__)
+
+PRINT_FORMATS = ("png", "svg", "pdf")
+
+# Tamaño físico por defecto de un módulo y resolución de la salida PNG
+DEFAULT_MODULE_MM = 1.0
+DEFAULT_DPI = 300
+
+# Bytes comprimidos acumulados antes de emitir un bloque IDAT
+_IDAT_CHUNK_BYTES = 256 * 1024
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Filtros PNG por fila: la primera fila de cada módulo va sin filtro y las repetidas con "Up",
+# que las deja a cero (se comprimen a casi nada)
+_FILTER_NONE = b"\x00"
+_FILTER_UP = b"\x02"
+
+def print_color_index(red_data, green_data, blue_data):
+    # Índice de color de 3 bits a resolución de módulo (sin zona de silencio) para las tres capas
+    matrices = create_layer_matrices(red_data, green_data, blue_data, min_error_correction=MIN_ERROR_CORRECTION)
+    if matrices is None:
+        return None
+    return compose_color_index(*matrices)
+
+def print_box_size(module_mm=DEFAULT_MODULE_MM, dpi=DEFAULT_DPI):
+    # Píxeles por módulo para un tamaño físico de módulo a una resolución dada
+    return max(1, int(round(module_mm / 25.4 * dpi)))
+
+def _png_chunk(output, chunk_type, data=b""):
+    output.write(struct.pack(">I", len(data)))
+    output.write(chunk_type)
+    output.write(data)
+    output.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+def write_png_stream(color_index, output, box_size, border=QR_BORDER, dpi=None):
+    # PNG indexado de 4 bits escrito fila de módulos a fila de módulos: en memoria solo hay una
+    # línea de la imagen y el búfer del compresor, sea cual sea box_size
+    padded = np.pad(np.asarray(color_index, dtype=np.uint8), border)
+    size = padded.shape[0] * box_size
+
+    output.write(_PNG_SIGNATURE)
+    _png_chunk(output, b"IHDR", struct.pack(">IIBBBBB", size, size, 4, 3, 0, 0, 0))
+    _png_chunk(output, b"PLTE", QRGB_PALETTE[:, :3].tobytes())
+    if dpi:
+        pixels_per_meter = int(round(dpi / 0.0254))
+        _png_chunk(output, b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 15, 9, zlib.Z_RLE)
+    repeated_line = _FILTER_UP + bytes((size + 1) // 2)
+    # Dos píxeles por byte (nibble alto primero); la línea se rellena a un número par de píxeles
+    line = np.zeros(size + size % 2, dtype=np.uint8)
+    pending = []
+    pending_bytes = 0
+    for module_row in padded:
+        line[:size] = np.repeat(module_row, box_size)
+        packed = (line[0::2] << 4) | line[1::2]
+        chunks = [compressor.compress(_FILTER_NONE + packed.tobytes())]
+        chunks += [compressor.compress(repeated_line) for _ in range(box_size - 1)]
+        for chunk in chunks:
+            if chunk:
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+        if pending_bytes >= _IDAT_CHUNK_BYTES:
+            _png_chunk(output, b"IDAT", b"".join(pending))
+            pending, pending_bytes = [], 0
+    pending.append(compressor.flush())
+    _png_chunk(output, b"IDAT", b"".join(pending))
+    _png_chunk(output, b"IEND")
+
+def _color_runs(color_index, border):
+    # Tramos horizontales de un mismo color: (fila, columna inicial, longitud, clase), en módulos
+    padded = np.pad(np.asarray(color_index, dtype=np.uint8), border)
+    rows, cols = padded.shape
+    # Cada fila empieza un tramo; dentro de ella, un tramo nuevo en cada cambio de color
+    starts = np.ones(padded.shape, dtype=bool)
+    starts[:, 1:] = padded[:, 1:] != padded[:, :-1]
+    ys, xs = np.nonzero(starts)
+    flat = ys * cols + xs
+    lengths = np.diff(np.append(flat, rows * cols))
+    return padded.shape[0], ys, xs, lengths, padded[ys, xs]
+
+def _hex_color(color_class):
+    red, green, blue = QRGB_PALETTE[color_class][:3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+def write_svg(color_index, output, module_mm=DEFAULT_MODULE_MM, border=QR_BORDER):
+    # Fondo negro (ninguna capa) y un trazado por color con sus tramos horizontales
+    size, ys, xs, lengths, classes = _color_runs(color_index, border)
+    physical = f"{size * module_mm:g}mm"
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{physical}" height="{physical}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">\n',
+        f'<rect width="{size}" height="{size}" fill="{_hex_color(0)}"/>\n',
+    ]
+    for color_class in range(1, len(QRGB_PALETTE)):
+        selected = classes == color_class
+        if not selected.any():
+            continue
+        path = "".join(
+            f"M{x} {y}h{length}v1h-{length}z"
+            for y, x, length in zip(ys[selected].tolist(), xs[selected].tolist(), lengths[selected].tolist())
+        )
+        parts.append(f'<path fill="{_hex_color(color_class)}" d="{path}"/>\n')
+    parts.append("</svg>\n")
+    output.write("".join(parts).encode("ascii"))
+
+def write_pdf(color_index, output, module_mm=DEFAULT_MODULE_MM, border=QR_BORDER):
+    # PDF de una página con un rectángulo por tramo; las coordenadas van en módulos y una única
+    # transformación las lleva a puntos con el eje y hacia abajo
+    size, ys, xs, lengths, classes = _color_runs(color_index, border)
+    scale = module_mm * 72 / 25.4
+    page = size * scale
+
+    commands = [f"{scale:.6f} 0 0 {-scale:.6f} 0 {page:.6f} cm", f"0 0 0 rg 0 0 {size} {size} re f"]
+    for color_class in range(1, len(QRGB_PALETTE)):
+        selected = classes == color_class
+        if not selected.any():
+            continue
+        red, green, blue = (int(value) // 255 for value in QRGB_PALETTE[color_class][:3])
+        commands.append(f"{red} {green} {blue} rg")
+        commands.extend(
+            f"{x} {y} {length} 1 re"
+            for y, x, length in zip(ys[selected].tolist(), xs[selected].tolist(), lengths[selected].tolist())
+        )
+        commands.append("f")
+    content = zlib.compress("\n".join(commands).encode("ascii"), 6)
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page:.4f} {page:.4f}] /Contents 4 0 R >>".encode("ascii"),
+        f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode("ascii") + content + b"\nendstream",
+    ]
+    offset = output.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(offset)
+        offset += output.write(f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+    xref = [f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"]
+    xref += [f"{position:010d} 00000 n \n" for position in offsets]
+    xref.append(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{offset}\n%%EOF\n")
+    output.write("".join(xref).encode("ascii"))
+
+def export_qrgb(red_data, green_data, blue_data, output, fmt=None, module_mm=DEFAULT_MODULE_MM,
+                dpi=DEFAULT_DPI, border=QR_BORDER):
+    # Escribir un QRGB para impresión en una ruta o un archivo binario; el formato se deduce de la
+    # extensión si no se indica. Devuelve True si se escribió
+    try:
+        if fmt is None:
+            fmt = os.path.splitext(output)[1].lower().lstrip(".") if isinstance(output, str) else "png"
+        if fmt not in PRINT_FORMATS:
+            raise ValueError(f"Unknown print format: {fmt}")
+
+        color_index = print_color_index(red_data, green_data, blue_data)
+        if color_index is None:
+            logger.error("Failed to generate QRGB matrices for print")
+            return False
+
+        def write(output_file):
+            if fmt == "png":
+                write_png_stream(color_index, output_file, print_box_size(module_mm, dpi), border, dpi)
+            elif fmt == "svg":
+                write_svg(color_index, output_file, module_mm, border)
+            else:
+                write_pdf(color_index, output_file, module_mm, border)
+
+        if isinstance(output, str):
+            with open(output, "wb") as output_file:
+                write(output_file)
+        else:
+            write(output)
+        return True
+
+    except Exception as e:
+        logger.error(f"Error exporting QRGB: {str(e)}")
+        return False
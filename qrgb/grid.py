@@ -0,0 +1,220 @@
+# Decodificación por rejilla de módulos: se muestrea el color de cada módulo una sola vez sobre
+# el símbolo localizado y se clasifica en los 8 colores QRGB; el coste depende del número de
+# módulos y no del de píxeles
+import logging
+
+import numpy as np
+
+from .colors import classify_pixels
+from .matrix import _format_positions, _version_positions, version_template
+from .matrix_decode import MatrixDecodeError, decode_qr_matrix
+
+logger = logging.getLogger(__name__)
+
+# Submuestras por eje en el centro de cada módulo (se promedian para atenuar ruido y JPEG)
+GRID_SUBSAMPLES = 3
+# Contraste mínimo por canal entre módulos fijos oscuros y claros para fiarse del muestreo
+MIN_CHANNEL_CONTRAST = 40
+# Muestras por diagonal al medir los patrones de posición
+_FINDER_SCAN_SAMPLES = 512
+
+def _unit_homography(corners):
+    # Cuadrado unidad (x = columna, y = fila) -> esquinas del símbolo en la imagen
+    import cv2
+
+    unit = np.float32([[0, 0], [1, 0], [1, 1], [0, 1]])
+    return cv2.getPerspectiveTransform(unit, np.asarray(corners, dtype=np.float32))
+
+def _sample(pixels, homography, points):
+    # Color (interpolación bilineal) en los puntos del cuadrado unidad; points con forma (..., 2)
+    import cv2
+
+    # remap exige mapas 2D de menos de 32767 columnas: rejilla (N*k, N*k) o una fila para diagonales
+    grid_shape = points.shape[:2] if points.ndim == 3 else (1, -1)
+    projected = cv2.perspectiveTransform(points.reshape(1, -1, 2).astype(np.float32), homography).reshape(grid_shape + (2,))
+    map_x = np.ascontiguousarray(projected[..., 0])
+    map_y = np.ascontiguousarray(projected[..., 1])
+    sampled = cv2.remap(pixels, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return sampled.reshape(points.shape[:-1] + (pixels.shape[2],))
+
+def _finder_size(pixels, homography, origin, direction):
+    # Recorre la diagonal de un patrón de posición desde su esquina exterior: los tramos
+    # oscuro-claro-oscuro-claro-oscuro (1:1:3:1:1) abarcan 7 módulos. Devuelve el número de
+    # módulos por lado estimado o None si el patrón no aparece
+    t = (np.arange(_FINDER_SCAN_SAMPLES) + 0.5) / _FINDER_SCAN_SAMPLES * 0.5
+    points = np.asarray(origin, dtype=np.float32) + t[:, np.newaxis] * np.asarray(direction, dtype=np.float32)
+    # Un módulo oscuro en todas las capas es blanco en la imagen (canal más apagado alto)
+    values = _sample(pixels, homography, points).min(axis=-1).astype(np.float32)
+    dark = values > (values.min() + values.max()) / 2
+
+    # La esquina puede caer medio píxel fuera del símbolo: se admite un tramo claro inicial corto
+    start = int(np.argmax(dark))
+    if not dark[start] or start > _FINDER_SCAN_SAMPLES // 32:
+        return None
+    boundaries = np.flatnonzero(dark[start + 1:] != dark[start:-1]) + start + 1
+    if boundaries.size < 5:
+        return None
+    runs = np.diff(np.concatenate(([start], boundaries[:5])))
+    unit = runs.sum() / 7.0
+    # Tolerancia amplia en la proporción 1:1:3:1:1 (desenfoque, perspectiva)
+    if not all(abs(run - expected * unit) <= 0.75 * unit * expected + unit for run, expected in zip(runs, (1, 1, 3, 1, 1))):
+        return None
+    return 7.0 * _FINDER_SCAN_SAMPLES * 2 / runs.sum()
+
+def _timing_size(pixels, homography, size, vertical):
+    # Cuenta los tramos oscuros de la fila (o columna) 6: patrón de posición, temporización
+    # alterna (empieza y acaba en oscuro) y patrón de posición -> N = 2 * (tramos - 2) + 15.
+    # Basta una estimación aproximada del tamaño para caer dentro de la fila 6
+    samples = size * 6
+    t = (np.arange(samples) + 0.5) / samples
+    offset = np.full(samples, 6.5 / size)
+    points = np.stack((offset, t) if vertical else (t, offset), axis=-1)
+    values = _sample(pixels, homography, points).min(axis=-1).astype(np.float32)
+    dark = values > (values.min() + values.max()) / 2
+    runs = int(dark[0]) + int(np.count_nonzero(dark[1:] & ~dark[:-1]))
+    exact = 2 * (runs - 2) + 15
+    if exact < 21 or exact > 177 or (exact - 17) % 4:
+        return None
+    return exact
+
+def estimate_version(pixels, corners):
+    # Versión aproximada a partir del tamaño de los tres patrones de posición (mediana)
+    homography = _unit_homography(corners)
+    sizes = [
+        _finder_size(pixels, homography, origin, direction)
+        for origin, direction in (((0, 0), (1, 1)), ((1, 0), (-1, 1)), ((0, 1), (1, -1)))
+    ]
+    sizes = [size for size in sizes if size is not None]
+    if not sizes:
+        return None
+    version = int(round((float(np.median(sizes)) - 17) / 4))
+    return min(max(version, 1), 40)
+
+def candidate_versions(pixels, corners):
+    # Versiones a probar, de la más a la menos probable: las que dan los patrones de temporización
+    # (exactas si se leen bien) y la estimación por patrones de posición con sus vecinas
+    estimate = estimate_version(pixels, corners)
+    if estimate is None:
+        return []
+    homography = _unit_homography(corners)
+    candidates = []
+    for vertical in (False, True):
+        size = _timing_size(pixels, homography, estimate * 4 + 17, vertical)
+        if size is not None:
+            candidates.append((size - 17) // 4)
+    candidates += [estimate, estimate - 1, estimate + 1]
+    return [version for version in dict.fromkeys(candidates) if 1 <= version <= 40]
+
+def sample_module_grid(pixels, corners, version, subsamples=GRID_SUBSAMPLES):
+    # Color medio (N, N, 3) en el centro de cada módulo del símbolo
+    size = version * 4 + 17
+    offsets = (np.arange(subsamples) + 0.5) / subsamples * 0.5 + 0.25
+    centres = (np.arange(size)[:, np.newaxis] + offsets[np.newaxis, :]).ravel() / size
+    ys, xs = np.meshgrid(centres, centres, indexing="ij")
+    points = np.stack((xs, ys), axis=-1)
+    sampled = _sample(pixels, _unit_homography(corners), points).astype(np.float32)
+    # (N*k, N*k, 3) -> (N, k, N, k, 3) -> media por módulo
+    return sampled.reshape(size, subsamples, size, subsamples, -1).mean(axis=(1, 3))
+
+def _fixed_modules(version):
+    # Módulos fijos comunes a las tres capas (posición, alineación y temporización) y su valor
+    modules, reserved, _, _, _ = version_template(version)
+    size = modules.shape[0]
+    fixed = reserved.copy()
+    vertical, horizontal = _format_positions(size)
+    positions = vertical + horizontal + [(size - 8, 8)]
+    if version >= 7:
+        first, second = _version_positions(size)
+        positions += first + second
+    rows, cols = zip(*positions)
+    fixed[list(rows), list(cols)] = False
+    return fixed & modules, fixed & ~modules
+
+def _fixed_contrast(pixels, corners, points, signs):
+    import cv2
+
+    homography = cv2.getPerspectiveTransform(np.float32([[0, 0], [1, 0], [1, 1], [0, 1]]), corners)
+    values = _sample(pixels, homography, points).min(axis=-1).astype(np.float32)
+    return float(values @ signs)
+
+def refine_corners(pixels, corners, version):
+    # OpenCV extrapola la esquina inferior derecha (no tiene patrón de posición) y con perspectiva
+    # se desvía. Se ajusta buscando, de grueso a fino, el desplazamiento que maximiza el contraste
+    # de los módulos fijos (alineación, temporización y posición) con su valor conocido
+    if version < 2:
+        return corners
+    size = version * 4 + 17
+    dark, light = _fixed_modules(version)
+    rows, cols = np.nonzero(dark | light)
+    points = np.stack(((cols + 0.5) / size, (rows + 0.5) / size), axis=-1)
+    signs = np.where(dark[rows, cols], 1.0, -1.0).astype(np.float32)
+    signs[signs > 0] /= np.count_nonzero(signs > 0)
+    signs[signs < 0] /= np.count_nonzero(signs < 0)
+
+    corners = np.array(corners, dtype=np.float32)
+    module = np.array([corners[2] - corners[3], corners[2] - corners[1]], dtype=np.float32) / size
+    best_offset = np.zeros(2, dtype=np.float32)
+    for radius, step in ((2.0, 0.5), (0.5, 0.125)):
+        steps = np.arange(-radius, radius + step / 2, step, dtype=np.float32)
+        offsets = best_offset + np.stack(np.meshgrid(steps, steps, indexing="ij"), axis=-1).reshape(-1, 2)
+        scores = []
+        for offset in offsets:
+            candidate = corners.copy()
+            candidate[2] = corners[2] + offset[0] * module[0] + offset[1] * module[1]
+            scores.append(_fixed_contrast(pixels, candidate, points, signs))
+        # En imágenes nítidas el máximo es una meseta: se toma su centro
+        scores = np.array(scores)
+        plateau = scores >= scores.max() - 0.02 * (scores.max() - scores.min())
+        best_offset = offsets[plateau].mean(axis=0)
+    corners[2] = corners[2] + best_offset[0] * module[0] + best_offset[1] * module[1]
+    return corners
+
+def classify_modules(colors, version, lut=None):
+    # Una matriz booleana por capa (True = módulo oscuro). Un módulo oscuro en una capa enciende
+    # su canal; sin tabla de colores calibrada, el umbral de cada canal es el punto medio entre
+    # los módulos fijos oscuros (blancos en la imagen) y claros (negros). Devuelve None si el
+    # contraste es insuficiente
+    dark, light = _fixed_modules(version)
+    dark_level = np.median(colors[dark], axis=0)
+    light_level = np.median(colors[light], axis=0)
+    if np.any(dark_level - light_level < MIN_CHANNEL_CONTRAST):
+        return None
+    if lut is not None:
+        classes = classify_pixels(colors, lut)
+        return tuple((classes & (1 << shift)) != 0 for shift in (2, 1, 0))
+    thresholds = (dark_level + light_level) / 2
+    layers = colors > thresholds
+    return tuple(layers[..., channel] for channel in range(3))
+
+def _decode_layer(matrix):
+    try:
+        return decode_qr_matrix(matrix)
+    except MatrixDecodeError:
+        return None
+
+def _decode_grid(pixels, corners, version, lut):
+    layers = classify_modules(sample_module_grid(pixels, corners, version), version, lut)
+    if layers is None:
+        return None, None, None
+    return tuple(_decode_layer(layer) for layer in layers)
+
+def decode_module_grid(pixels, corners, lut=None):
+    # Decodificar las tres capas desde un único muestreo de la rejilla por versión candidata
+    # (con la esquina inferior derecha ajustada si hace falta); devuelve (rojo, verde, azul)
+    # con None en las capas no legibles
+    try:
+        best = (None, None, None)
+        for version in candidate_versions(pixels, corners):
+            results = _decode_grid(pixels, corners, version, lut)
+            if not all(results):
+                refined = _decode_grid(pixels, refine_corners(pixels, corners, version), version, lut)
+                results = refined if sum(map(bool, refined)) > sum(map(bool, results)) else results
+            if all(results):
+                return results
+            if sum(map(bool, results)) > sum(map(bool, best)):
+                best = results
+        return best
+
+    except Exception as e:
+        logger.error(f"Error in decode_module_grid: {str(e)}")
+        return None, None, None
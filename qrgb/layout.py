@@ -0,0 +1,76 @@
+# Planificación de la rejilla común: versión mínima y nivel de corrección para las tres capas
+import bisect
+
+from qrcode import constants, util
+from qrcode.exceptions import DataOverflowError
+
+# Niveles de corrección de errores ordenados de menor a mayor redundancia
+ERROR_CORRECTION_ORDER = (
+    constants.ERROR_CORRECT_L,
+    constants.ERROR_CORRECT_M,
+    constants.ERROR_CORRECT_Q,
+    constants.ERROR_CORRECT_H,
+)
+
+def _segments(data):
+    # Mismos segmentos que qrcode.QRCode.add_data (optimize=20)
+    return util.optimal_data_chunks(data, minimum=20)
+
+def _needed_bits(segments, version):
+    # Bits de datos necesarios en una versión (el tamaño del campo de longitud depende de ella)
+    mode_sizes = util.mode_sizes_for_version(version)
+    buffer = util.BitBuffer()
+    for segment in segments:
+        buffer.put(segment.mode, 4)
+        buffer.put(len(segment), mode_sizes[segment.mode])
+        segment.write(buffer)
+    return len(buffer)
+
+def _fits(all_segments, version, error_correction):
+    limit = util.BIT_LIMIT_TABLE[error_correction][version]
+    return all(_needed_bits(segments, version) <= limit for segments in all_segments)
+
+def _minimal_version(all_segments, error_correction, min_version):
+    limits = util.BIT_LIMIT_TABLE[error_correction]
+    version = min_version
+    while version <= 40:
+        # Estimación por búsqueda binaria con la capa más exigente y verificación exacta
+        # (el tamaño del campo de longitud cambia en las versiones 10 y 27)
+        needed = max(_needed_bits(segments, version) for segments in all_segments)
+        candidate = bisect.bisect_left(limits, needed, version)
+        if candidate > 40:
+            break
+        if _fits(all_segments, candidate, error_correction):
+            return candidate
+        version = candidate + 1
+    raise DataOverflowError()
+
+def minimal_version(payloads, error_correction=constants.ERROR_CORRECT_H, min_version=1):
+    # Versión más pequeña en la que caben todas las capas con el nivel de corrección dado
+    return _minimal_version([list(_segments(data)) for data in payloads], error_correction, min_version)
+
+def _best_error_correction(all_segments, version, min_error_correction):
+    # Nivel de corrección más alto, a partir del mínimo, que sigue cabiendo en la versión
+    start = ERROR_CORRECTION_ORDER.index(min_error_correction)
+    error_correction = min_error_correction
+    for candidate in ERROR_CORRECTION_ORDER[start + 1:]:
+        if not _fits(all_segments, version, candidate):
+            break
+        error_correction = candidate
+    return error_correction
+
+def plan_qr_layout(payloads, min_error_correction=constants.ERROR_CORRECT_H, min_version=1):
+    # Elegir la versión más pequeña para el nivel mínimo exigido y, dentro de esa versión,
+    # subir al nivel de corrección más alto que siga cabiendo (redundancia gratuita).
+    # Devuelve (versión, nivel de corrección); lanza DataOverflowError si no caben
+    all_segments = [list(_segments(data)) for data in payloads]
+    version = _minimal_version(all_segments, min_error_correction, min_version)
+    return version, _best_error_correction(all_segments, version, min_error_correction)
+
+def plan_error_correction(payloads, version, min_error_correction=constants.ERROR_CORRECT_H):
+    # Con la versión fijada por el llamante: solo se elige el nivel de corrección (el más alto que
+    # quepa, a partir del mínimo). Lanza DataOverflowError si no caben ni con el mínimo
+    all_segments = [list(_segments(data)) for data in payloads]
+    if not _fits(all_segments, version, min_error_correction):
+        raise DataOverflowError()
+    return _best_error_correction(all_segments, version, min_error_correction)
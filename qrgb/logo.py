@@ -0,0 +1,58 @@
+# Carga, caché y pegado de logos sobre los códigos QRGB
+import hashlib
+from io import BytesIO
+
+from PIL import Image
+
+from .cache import LRUCache
+from .metrics import register_cache
+from .utils import as_bytes
+
+# Caché de logos por hash de contenido, acotada en bytes: guarda el logo RGBA decodificado
+# (clave: hash) y sus variantes redimensionadas con su máscara alfa (clave: hash, ancho)
+LOGO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+def _image_nbytes(img):
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+def _logo_entry_nbytes(value):
+    if isinstance(value, tuple):
+        return sum(_image_nbytes(img) for img in value)
+    return _image_nbytes(value)
+
+logo_cache = LRUCache(LOGO_CACHE_MAX_BYTES, _logo_entry_nbytes)
+register_cache("logo", logo_cache)
+
+def _decode_logo(data):
+    return Image.open(BytesIO(data)).convert("RGBA")
+
+def _resize_logo(logo, basewidth):
+    # Redimensionar el logo a un tamaño proporcional
+    wpercent = (basewidth / float(logo.size[0]))
+    hsize = int((float(logo.size[1]) * float(wpercent)))
+    resized = logo.resize((basewidth, hsize), Image.LANCZOS)
+    
+    # Crear una máscara para suavizar los bordes del logo
+    return resized, resized.getchannel("A")
+
+def logo_digest(logo_file):
+    # Hash del contenido del logo (clave de las cachés de logos y del almacén de resultados)
+    return hashlib.sha256(as_bytes(logo_file)).hexdigest()
+
+def get_logo_variant(logo_file, basewidth):
+    # Devuelve (logo redimensionado, máscara alfa); las imágenes son compartidas y no deben modificarse
+    data = as_bytes(logo_file)
+    key = logo_digest(data)
+    
+    def resize():
+        logo = logo_cache.get_or_create(key, lambda: _decode_logo(data))
+        return _resize_logo(logo, basewidth)
+    
+    return logo_cache.get_or_create((key, basewidth), resize)
+
+def _paste_logo(img, logo_file):
+    logo, mask = get_logo_variant(logo_file, img.size[0] // 4)
+    
+    # Posicionar el logo en el centro y pegarlo en el QR code
+    pos = ((img.size[0] - logo.size[0]) // 2, (img.size[1] - logo.size[1]) // 2)
+    img.paste(logo, pos, mask)
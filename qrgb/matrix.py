@@ -0,0 +1,307 @@
+# Construcción vectorizada de matrices QR con NumPy, idéntica módulo a módulo a qrcode.QRCode.make
+import functools
+import os
+
+import numpy as np
+from qrcode import LUT, base, constants, util
+from qrcode.exceptions import DataOverflowError
+
+from .cache import LRUCache
+from .metrics import register_cache
+
+# Patrones 1:1:3:1:1 con zona clara de 4 módulos (regla 3 de penalización), como enteros de 11 bits
+_FINDER_LIKE_PATTERNS = (0b10111010000, 0b00001011101)
+_FINDER_LIKE_WEIGHTS = (1 << np.arange(10, -1, -1)).astype(np.int16)
+
+def _place_finder(modules, reserved, row, col):
+    size = modules.shape[0]
+    for r in range(-1, 8):
+        for c in range(-1, 8):
+            if not (0 <= row + r < size and 0 <= col + c < size):
+                continue
+            modules[row + r, col + c] = (
+                (0 <= r <= 6 and c in (0, 6))
+                or (0 <= c <= 6 and r in (0, 6))
+                or (2 <= r <= 4 and 2 <= c <= 4)
+            )
+            reserved[row + r, col + c] = True
+
+def _format_positions(size):
+    # Posiciones de los 15 bits de formato (copia vertical y horizontal), en el orden de qrcode
+    vertical = [(i, 8) if i < 6 else (i + 1, 8) if i < 8 else (size - 15 + i, 8) for i in range(15)]
+    horizontal = [(8, size - i - 1) if i < 8 else (8, 15 - i) if i < 9 else (8, 15 - i - 1) for i in range(15)]
+    return vertical, horizontal
+
+def _version_positions(size):
+    first = [(i // 3, i % 3 + size - 11) for i in range(18)]
+    second = [(i % 3 + size - 11, i // 3) for i in range(18)]
+    return first, second
+
+def _data_order(reserved):
+    # Recorrido en zigzag de dos columnas (de abajo a arriba y vuelta) de las celdas de datos
+    size = reserved.shape[0]
+    rows, cols = [], []
+    upward = True
+    col = size - 1
+    while col > 0:
+        if col == 6:
+            col -= 1
+        row_range = range(size - 1, -1, -1) if upward else range(size)
+        for row in row_range:
+            for c in (col, col - 1):
+                if not reserved[row, c]:
+                    rows.append(row)
+                    cols.append(c)
+        upward = not upward
+        col -= 2
+    return np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)
+
+def _mask_grids(size):
+    i, j = np.indices((size, size))
+    return np.stack([
+        (i + j) % 2 == 0,
+        i % 2 == 0,
+        j % 3 == 0,
+        (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0,
+        (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+        ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+
+# Una plantilla por versión (40 como máximo, ~4 MiB en total)
+@functools.lru_cache(maxsize=40)
+def version_template(version):
+    # Plantilla precalculada por versión: patrones de función, celdas reservadas (incluidas las
+    # de formato y versión), orden de colocación de datos y las 8 máscaras sobre esas celdas
+    util.check_version(version)
+    size = version * 4 + 17
+    modules = np.zeros((size, size), dtype=bool)
+    reserved = np.zeros((size, size), dtype=bool)
+
+    # Patrones de posición con su separador
+    _place_finder(modules, reserved, 0, 0)
+    _place_finder(modules, reserved, size - 7, 0)
+    _place_finder(modules, reserved, 0, size - 7)
+
+    # Patrones de alineación (se omiten los que se solapan con los de posición)
+    positions = util.pattern_position(version)
+    for row in positions:
+        for col in positions:
+            if reserved[row, col]:
+                continue
+            r, c = np.indices((5, 5)) - 2
+            modules[row - 2:row + 3, col - 2:col + 3] = (np.abs(r) == 2) | (np.abs(c) == 2) | ((r == 0) & (c == 0))
+            reserved[row - 2:row + 3, col - 2:col + 3] = True
+
+    # Patrones de temporización
+    timing = np.arange(8, size - 8)
+    free_row = ~reserved[timing, 6]
+    modules[timing[free_row], 6] = timing[free_row] % 2 == 0
+    reserved[timing, 6] = True
+    free_col = ~reserved[6, timing]
+    modules[6, timing[free_col]] = timing[free_col] % 2 == 0
+    reserved[6, timing] = True
+
+    # Áreas de formato, módulo fijo e información de versión (su valor depende de cada código)
+    vertical, horizontal = _format_positions(size)
+    for row, col in vertical + horizontal + [(size - 8, 8)]:
+        reserved[row, col] = True
+    if version >= 7:
+        first, second = _version_positions(size)
+        for row, col in first + second:
+            reserved[row, col] = True
+
+    rows, cols = _data_order(reserved)
+    masks = _mask_grids(size)[:, rows, cols]
+    for array in (modules, reserved, rows, cols, masks):
+        array.flags.writeable = False
+    return modules, reserved, rows, cols, masks
+
+# Aritmética en GF(256) de qrcode: tabla de multiplicación completa (64 KiB)
+_GF_LOG = np.array(base.LOG_TABLE, dtype=np.int64)
+_GF_EXP = np.array(base.EXP_TABLE, dtype=np.uint8)
+_GF_MUL = _GF_EXP[(_GF_LOG[:, np.newaxis] + _GF_LOG[np.newaxis, :]) % 255]
+_GF_MUL[0, :] = 0
+_GF_MUL[:, 0] = 0
+
+# Representación binaria de cada byte para volcar segmentos en modo byte sin bucles bit a bit
+_BYTE_BITS = tuple(format(value, "08b") for value in range(256))
+
+class _BitStringWriter:
+    # Interfaz mínima de qrcode.util.BitBuffer (put) que acumula los bits como texto
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def put(self, num, length):
+        self.chunks.append(format(num, f"0{length}b"))
+
+@functools.lru_cache(maxsize=None)
+def _generator(ec_count):
+    # Coeficientes del polinomio generador de Reed-Solomon (sin el término líder)
+    if ec_count in LUT.rsPoly_LUT:
+        coefficients = LUT.rsPoly_LUT[ec_count]
+    else:
+        poly = base.Polynomial([1], 0)
+        for i in range(ec_count):
+            poly = poly * base.Polynomial([1, base.gexp(i)], 0)
+        coefficients = [poly[i] for i in range(len(poly))]
+    return np.array(coefficients[1:], dtype=np.uint8)
+
+def _data_bytes(data, version, error_correction):
+    # Flujo de datos con terminador y relleno, igual que qrcode.util.create_data
+    mode_sizes = util.mode_sizes_for_version(version)
+    chunks = []
+    writer = _BitStringWriter(chunks)
+    for segment in util.optimal_data_chunks(data, minimum=20):
+        chunks.append(format(segment.mode, "04b"))
+        chunks.append(format(len(segment), f"0{mode_sizes[segment.mode]}b"))
+        if segment.mode == util.MODE_8BIT_BYTE:
+            chunks.append("".join(map(_BYTE_BITS.__getitem__, segment.data)))
+        else:
+            segment.write(writer)
+    bits = "".join(chunks)
+
+    bit_limit = util.BIT_LIMIT_TABLE[error_correction][version]
+    if len(bits) > bit_limit:
+        raise DataOverflowError(
+            "Code length overflow. Data size (%s) > size available (%s)" % (len(bits), bit_limit)
+        )
+    bits += "0" * min(bit_limit - len(bits), 4)
+    bits += "0" * (-len(bits) % 8)
+
+    payload = int(bits, 2).to_bytes(len(bits) // 8, "big")
+    padding = bytes((util.PAD0, util.PAD1)) * (bit_limit // 16 + 1)
+    return payload + padding[:bit_limit // 8 - len(payload)]
+
+def _codewords(data, version, error_correction):
+    # Codewords de datos + Reed-Solomon intercalados por bloques (qrcode.util.create_bytes).
+    # Todos los bloques avanzan a la vez: los más cortos se rellenan con ceros a la izquierda,
+    # lo que no cambia el resto de la división polinómica
+    data_bytes = np.frombuffer(_data_bytes(data, version, error_correction), dtype=np.uint8)
+    blocks = base.rs_blocks(version, error_correction)
+    data_counts = np.array([block.data_count for block in blocks])
+    max_data = data_counts.max()
+    ec_count = blocks[0].total_count - blocks[0].data_count
+
+    offsets = np.concatenate(([0], np.cumsum(data_counts)[:-1]))
+    columns = np.arange(max_data)
+    valid = columns[np.newaxis, :] < data_counts[:, np.newaxis]
+    left_aligned = np.zeros((len(blocks), max_data), dtype=np.uint8)
+    left_aligned[valid] = data_bytes[(offsets[:, np.newaxis] + columns[np.newaxis, :])[valid]]
+
+    right_aligned = np.zeros_like(left_aligned)
+    shifted = columns[np.newaxis, :] >= (max_data - data_counts)[:, np.newaxis]
+    right_aligned[shifted] = left_aligned[valid]
+
+    generator = _generator(ec_count)
+    remainder = np.zeros((len(blocks), ec_count), dtype=np.uint8)
+    for column in range(max_data):
+        factor = right_aligned[:, column] ^ remainder[:, 0]
+        remainder[:, :-1] = remainder[:, 1:]
+        remainder[:, -1] = 0
+        remainder ^= _GF_MUL[factor[:, np.newaxis], generator[np.newaxis, :]]
+
+    return np.concatenate((left_aligned.T[valid.T], remainder.T.ravel()))
+
+def _data_bits(data, version, error_correction, capacity):
+    # Bits MSB de los codewords; los bits sobrantes de la matriz quedan a 0
+    bits = np.zeros(capacity, dtype=bool)
+    unpacked = np.unpackbits(_codewords(data, version, error_correction)).view(bool)[:capacity]
+    bits[:unpacked.size] = unpacked
+    return bits
+
+def _run_penalty(stack):
+    # Regla 1: tramos de 5 o más módulos iguales en filas, N - 2 puntos por tramo
+    count, size, _ = stack.shape
+    padded = np.full((count, size, size + 1), 2, dtype=np.int8)
+    padded[:, :, :size] = stack
+    flat = padded.reshape(count, -1)
+    penalties = np.zeros(count, dtype=np.int64)
+    for index in range(count):
+        row = flat[index]
+        starts = np.concatenate(([0], np.flatnonzero(row[1:] != row[:-1]) + 1))
+        lengths = np.diff(np.append(starts, row.size))
+        lengths = lengths[(row[starts] != 2) & (lengths >= 5)]
+        penalties[index] = (lengths - 2).sum()
+    return penalties
+
+def _finder_like_penalty(stack):
+    # Regla 3: ventanas de 11 módulos en filas que coinciden con 1011101 + 0000 (o su simétrico)
+    size = stack.shape[-1]
+    codes = np.zeros(stack.shape[:2] + (size - 10,), dtype=np.int16)
+    for offset, weight in enumerate(_FINDER_LIKE_WEIGHTS):
+        codes += stack[:, :, offset:offset + size - 10] * weight
+    matches = (codes == _FINDER_LIKE_PATTERNS[0]) | (codes == _FINDER_LIKE_PATTERNS[1])
+    return matches.sum(axis=(1, 2)) * 40
+
+def mask_penalties(stack):
+    # Penalización de qrcode.util.lost_point para una pila (n, N, N) de matrices candidatas
+    size = stack.shape[-1]
+    transposed = stack.transpose(0, 2, 1)
+
+    level1 = _run_penalty(stack) + _run_penalty(np.ascontiguousarray(transposed))
+
+    # Regla 2: bloques 2x2 del mismo color, 3 puntos cada uno
+    top_left = stack[:, :-1, :-1]
+    uniform = (top_left == stack[:, 1:, :-1]) & (top_left == stack[:, :-1, 1:]) & (top_left == stack[:, 1:, 1:])
+    level2 = uniform.sum(axis=(1, 2)) * 3
+
+    level3 = _finder_like_penalty(stack) + _finder_like_penalty(transposed)
+
+    # Regla 4: desviación de la proporción de módulos oscuros respecto al 50 %
+    dark = stack.sum(axis=(1, 2))
+    level4 = [int(abs(float(count) / (size ** 2) * 100 - 50) / 5) * 10 for count in dark]
+
+    return [int(total) for total in level1 + level2 + level3 + np.array(level4)]
+
+def _write_bits(matrix, positions, bits):
+    for index, (row, col) in enumerate(positions):
+        matrix[row, col] = (bits >> index) & 1
+
+def build_qr_matrix(data, version, error_correction=constants.ERROR_CORRECT_H, mask_pattern=None):
+    # Matriz booleana (N x N, sin zona de silencio) igual a QRCode(version, error_correction).modules
+    # tras make(fit=False); con mask_pattern=None se elige la máscara de menor penalización
+    modules, reserved, rows, cols, masks = version_template(version)
+    size = modules.shape[0]
+    bits = _data_bits(data, version, error_correction, rows.size)
+
+    if mask_pattern is None:
+        # Candidatas de prueba como las de qrcode: formato, versión y módulo fijo en claro
+        candidates = np.repeat(modules[np.newaxis], 8, axis=0)
+        candidates[:, rows, cols] = bits ^ masks
+        penalties = mask_penalties(candidates)
+        mask_pattern = penalties.index(min(penalties))
+
+    matrix = modules.copy()
+    matrix[rows, cols] = bits ^ masks[mask_pattern]
+
+    format_bits = util.BCH_type_info((error_correction << 3) | mask_pattern)
+    vertical, horizontal = _format_positions(size)
+    _write_bits(matrix, vertical, format_bits)
+    _write_bits(matrix, horizontal, format_bits)
+    matrix[size - 8, 8] = True
+
+    if version >= 7:
+        version_bits = util.BCH_type_number(version)
+        first, second = _version_positions(size)
+        _write_bits(matrix, first, version_bits)
+        _write_bits(matrix, second, version_bits)
+
+    return matrix
+
+# Caché LRU de matrices terminadas por (datos, versión, corrección, máscara): las cargas útiles
+# repetidas (p. ej. la URL de la empresa en una capa de todo un catálogo) cuestan una búsqueda.
+# El límite se configura con QRGB_MATRIX_CACHE_BYTES o asignando matrix_cache.max_bytes
+MATRIX_CACHE_MAX_BYTES = int(os.environ.get("QRGB_MATRIX_CACHE_BYTES", 32 * 1024 * 1024))
+matrix_cache = LRUCache(MATRIX_CACHE_MAX_BYTES, lambda matrix: matrix.nbytes)
+register_cache("matrix", matrix_cache)
+
+def cached_qr_matrix(data, version, error_correction=constants.ERROR_CORRECT_H, mask_pattern=None):
+    # Igual que build_qr_matrix, pero la matriz devuelta es compartida y de solo lectura
+    def build():
+        matrix = build_qr_matrix(data, version, error_correction, mask_pattern)
+        matrix.flags.writeable = False
+        return matrix
+
+    return matrix_cache.get_or_create((data, version, error_correction, mask_pattern), build)
@@ -0,0 +1,279 @@
+# Decodificación de matrices QR ya muestreadas (N x N booleana, sin zona de silencio):
+# formato, desenmascarado, corrección Reed-Solomon y lectura de segmentos
+import numpy as np
+from qrcode import base, util
+
+from .matrix import _format_positions, _version_positions, version_template
+
+# Aritmética en GF(256) con enteros de Python: los bloques son cortos (<= 153 bytes)
+_EXP = list(base.EXP_TABLE[:255]) * 2
+_LOG = list(base.LOG_TABLE)
+_NP_EXP = np.array(base.EXP_TABLE[:255], dtype=np.int64)
+_NP_LOG = np.array(base.LOG_TABLE, dtype=np.int64)
+
+# Palabras de formato válidas (ya enmascaradas) -> (nivel de corrección, máscara)
+_FORMAT_CODES = {util.BCH_type_info(value): (value >> 3, value & 7) for value in range(32)}
+_VERSION_CODES = {util.BCH_type_number(version): version for version in range(7, 41)}
+
+# Segmentos admitidos además de los de datos de qrcode
+_MODE_ECI = 0b0111
+_MODE_STRUCTURED_APPEND = 0b0011
+_MODE_FNC1_FIRST = 0b0101
+_MODE_FNC1_SECOND = 0b1001
+
+_ECI_CHARSETS = {3: "latin-1", 20: "shift_jis", 26: "utf-8"}
+
+class MatrixDecodeError(ValueError):
+    pass
+
+def _gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+def _gf_div(a, b):
+    if a == 0:
+        return 0
+    return _EXP[_LOG[a] + 255 - _LOG[b]]
+
+def _poly_eval_low(poly, x):
+    # Polinomio con el coeficiente de menor grado primero
+    result = 0
+    for coefficient in reversed(poly):
+        result = _gf_mul(result, x) ^ coefficient
+    return result
+
+def _syndromes(block, ec_count):
+    # S_j = r(alfa^j), con block[0] como coeficiente de mayor grado (raíces desde alfa^0).
+    # Vectorizado: en los bloques sin errores (el caso habitual) es todo el trabajo de corrección
+    values = np.asarray(block, dtype=np.int64)
+    nonzero = values != 0
+    degrees = np.arange(len(block) - 1, -1, -1)[nonzero]
+    exponents = (_NP_LOG[values[nonzero]][np.newaxis, :] + np.arange(ec_count)[:, np.newaxis] * degrees[np.newaxis, :]) % 255
+    return np.bitwise_xor.reduce(_NP_EXP[exponents], axis=1).tolist() if degrees.size else [0] * ec_count
+
+def _error_locator(syndromes):
+    # Berlekamp-Massey: polinomio localizador (coeficiente de menor grado primero)
+    locator, previous = [1], [1]
+    errors, shift, last_discrepancy = 0, 1, 1
+    for n, syndrome in enumerate(syndromes):
+        discrepancy = syndrome
+        for i in range(1, errors + 1):
+            discrepancy ^= _gf_mul(locator[i], syndromes[n - i])
+        if discrepancy == 0:
+            shift += 1
+            continue
+        factor = _gf_div(discrepancy, last_discrepancy)
+        updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+        for i, coefficient in enumerate(previous):
+            updated[i + shift] ^= _gf_mul(factor, coefficient)
+        if 2 * errors <= n:
+            previous, errors, last_discrepancy, shift = locator, n + 1 - errors, discrepancy, 1
+        else:
+            shift += 1
+        locator = updated
+    return locator[:errors + 1], errors
+
+def correct_block(block, ec_count):
+    # Corrige en sitio un bloque (datos + EC); devuelve el número de errores corregidos.
+    # Lanza MatrixDecodeError si el bloque tiene más errores de los que puede corregir
+    syndromes = _syndromes(block, ec_count)
+    if not any(syndromes):
+        return 0
+
+    locator, errors = _error_locator(syndromes)
+    if 2 * errors > ec_count:
+        raise MatrixDecodeError("Too many errors in block")
+
+    # Búsqueda de Chien: el coeficiente block[i] tiene grado n - 1 - i
+    length = len(block)
+    positions = []
+    for i in range(length):
+        degree = length - 1 - i
+        if _poly_eval_low(locator, _EXP[255 - degree]) == 0:
+            positions.append((i, degree))
+    if len(positions) != errors:
+        raise MatrixDecodeError("Error locator has no valid roots")
+
+    # Forney (primera raíz alfa^0): e = X * Omega(X^-1) / Lambda'(X^-1)
+    evaluator = [0] * ec_count
+    for i, syndrome in enumerate(syndromes):
+        for j, coefficient in enumerate(locator):
+            if i + j < ec_count:
+                evaluator[i + j] ^= _gf_mul(syndrome, coefficient)
+    derivative = [locator[i] if i % 2 else 0 for i in range(1, len(locator))]
+    for i, degree in positions:
+        x = _EXP[degree]
+        x_inverse = _EXP[255 - degree]
+        denominator = _poly_eval_low(derivative, x_inverse)
+        if denominator == 0:
+            raise MatrixDecodeError("Error evaluator division by zero")
+        block[i] ^= _gf_mul(x, _gf_div(_poly_eval_low(evaluator, x_inverse), denominator))
+
+    if any(_syndromes(block, ec_count)):
+        raise MatrixDecodeError("Uncorrectable block")
+    return errors
+
+def _read_bits(matrix, positions):
+    value = 0
+    for index, (row, col) in enumerate(positions):
+        if matrix[row, col]:
+            value |= 1 << index
+    return value
+
+def _closest_code(codes, *values, max_distance=3):
+    # Palabra BCH válida más cercana a alguna de las copias leídas (distancia de Hamming <= 3)
+    best, best_distance = None, max_distance + 1
+    for value in values:
+        for code, decoded in codes.items():
+            distance = bin(code ^ value).count("1")
+            if distance < best_distance:
+                best, best_distance = decoded, distance
+    return best
+
+def read_format(matrix):
+    # (nivel de corrección, máscara) a partir de las dos copias de la información de formato
+    vertical, horizontal = _format_positions(matrix.shape[0])
+    decoded = _closest_code(_FORMAT_CODES, _read_bits(matrix, vertical), _read_bits(matrix, horizontal))
+    if decoded is None:
+        raise MatrixDecodeError("Unreadable format information")
+    return decoded
+
+def read_version(matrix):
+    # Versión según el tamaño; desde la 7 se contrasta con los bloques de información de versión
+    size = matrix.shape[0]
+    version = (size - 17) // 4
+    if size < 21 or (size - 17) % 4 or version > 40:
+        raise MatrixDecodeError(f"Invalid QR matrix size: {size}")
+    if version >= 7:
+        first, second = _version_positions(size)
+        encoded = _closest_code(_VERSION_CODES, _read_bits(matrix, first), _read_bits(matrix, second))
+        if encoded != version:
+            raise MatrixDecodeError("Version information does not match matrix size")
+    return version
+
+def _codewords(matrix, version, error_correction, mask_pattern):
+    # Bits de datos desenmascarados en orden de colocación, agrupados en bytes y desintercalados
+    _, _, rows, cols, masks = version_template(version)
+    bits = matrix[rows, cols] ^ masks[mask_pattern]
+    stream = np.packbits(bits).tolist()
+
+    blocks = base.rs_blocks(version, error_correction)
+    data = [[] for _ in blocks]
+    ec = [[] for _ in blocks]
+    position = 0
+    for column in range(max(block.data_count for block in blocks)):
+        for index, block in enumerate(blocks):
+            if column < block.data_count:
+                data[index].append(stream[position])
+                position += 1
+    ec_count = blocks[0].total_count - blocks[0].data_count
+    for _ in range(ec_count):
+        for index in range(len(blocks)):
+            ec[index].append(stream[position])
+            position += 1
+    return data, ec, ec_count
+
+def _parse_segments(data, version):
+    # Lectura de segmentos (numérico, alfanumérico, byte, kanji y ECI) hasta el terminador
+    bits = "".join(format(value, "08b") for value in data)
+    mode_sizes = util.mode_sizes_for_version(version)
+    position = 0
+    pieces = []
+    raw = bytearray()
+    charset = None
+
+    def take(count):
+        nonlocal position
+        if position + count > len(bits):
+            raise MatrixDecodeError("Segment exceeds data capacity")
+        value = int(bits[position:position + count], 2)
+        position += count
+        return value
+
+    def flush():
+        if raw:
+            if charset:
+                pieces.append(raw.decode(charset, errors="replace"))
+            else:
+                try:
+                    pieces.append(raw.decode("utf-8"))
+                except UnicodeDecodeError:
+                    pieces.append(raw.decode("latin-1"))
+            raw.clear()
+
+    while len(bits) - position >= 4:
+        mode = take(4)
+        if mode == 0:
+            break
+        if mode == _MODE_ECI:
+            flush()
+            first = take(8)
+            if first & 0x80 == 0:
+                assignment = first
+            elif first & 0xC0 == 0x80:
+                assignment = ((first & 0x3F) << 8) | take(8)
+            else:
+                assignment = ((first & 0x1F) << 16) | take(16)
+            charset = _ECI_CHARSETS.get(assignment)
+        elif mode == _MODE_STRUCTURED_APPEND:
+            take(16)
+        elif mode == _MODE_FNC1_FIRST:
+            continue
+        elif mode == _MODE_FNC1_SECOND:
+            take(8)
+        elif mode == util.MODE_NUMBER:
+            count = take(mode_sizes[mode])
+            digits = []
+            while count >= 3:
+                digits.append(f"{take(10):03d}")
+                count -= 3
+            if count == 2:
+                digits.append(f"{take(7):02d}")
+            elif count == 1:
+                digits.append(str(take(4)))
+            raw.extend("".join(digits).encode("ascii"))
+        elif mode == util.MODE_ALPHA_NUM:
+            count = take(mode_sizes[mode])
+            chars = bytearray()
+            while count >= 2:
+                value = take(11)
+                chars.append(util.ALPHA_NUM[value // 45])
+                chars.append(util.ALPHA_NUM[value % 45])
+                count -= 2
+            if count:
+                chars.append(util.ALPHA_NUM[take(6)])
+            raw.extend(chars)
+        elif mode == util.MODE_8BIT_BYTE:
+            count = take(mode_sizes[mode])
+            raw.extend(take(8) for _ in range(count))
+        elif mode == util.MODE_KANJI:
+            flush()
+            count = take(mode_sizes[mode])
+            kanji = bytearray()
+            for _ in range(count):
+                value = take(13)
+                value = (value // 0xC0 << 8) | (value % 0xC0)
+                value += 0x8140 if value < 0x1F00 else 0xC140
+                kanji.extend(value.to_bytes(2, "big"))
+            pieces.append(kanji.decode("shift_jis", errors="replace"))
+        else:
+            raise MatrixDecodeError(f"Unknown segment mode: {mode:04b}")
+    flush()
+    return "".join(pieces)
+
+def decode_qr_matrix(matrix):
+    # Texto de una matriz QR booleana (True = módulo oscuro). Lanza MatrixDecodeError si no es legible
+    matrix = np.asarray(matrix, dtype=bool)
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise MatrixDecodeError("QR matrix must be square")
+    version = read_version(matrix)
+    error_correction, mask_pattern = read_format(matrix)
+
+    data, ec, ec_count = _codewords(matrix, version, error_correction, mask_pattern)
+    payload = []
+    for data_block, ec_block in zip(data, ec):
+        block = data_block + ec_block
+        correct_block(block, ec_count)
+        payload.extend(block[:len(data_block)])
+    return _parse_segments(payload, version)
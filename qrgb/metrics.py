@@ -0,0 +1,249 @@
+# Instrumentación ligera: temporizadores por etapa, contadores y tamaños en un registro en
+# memoria por proceso, exportable como texto de Prometheus o como JSON. Con variables de entorno
+# se activan el registro JSON por operación y los perfiles cProfile/tracemalloc
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# QRGB_METRICS=0 desactiva el registro (los temporizadores quedan en una llamada vacía)
+METRICS_ENABLED = os.environ.get("QRGB_METRICS", "1") != "0"
+# QRGB_METRICS_LOG=1: una línea JSON por operación con el desglose de sus etapas
+METRICS_LOG = os.environ.get("QRGB_METRICS_LOG", "0") not in ("", "0")
+# QRGB_PROFILE=cprofile, tracemalloc o ambos separados por comas; QRGB_PROFILE_DIR guarda los .prof
+PROFILE_MODES = {mode.strip() for mode in os.environ.get("QRGB_PROFILE", "").lower().split(",") if mode.strip()}
+PROFILE_DIR = os.environ.get("QRGB_PROFILE_DIR")
+# Funciones mostradas en el log cuando cProfile no guarda en disco
+PROFILE_TOP_FUNCTIONS = 15
+
+# Límites (segundos) del histograma de duración de las etapas
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_counters = {}
+_summaries = {}
+_histograms = {}
+_caches = {}
+# Operaciones perfiladas con tracemalloc en curso (una a la vez por proceso)
+_tracemalloc_lock = threading.Lock()
+# Operación en curso en cada hilo (las etapas de un pool de hilos solo cuentan en el registro global)
+_local = threading.local()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def increment(name, value=1, **labels):
+    # Contador monótono (p. ej. capas decodificadas por canal y resultado)
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    # Tamaños (píxeles, bytes): número de observaciones, suma y máximo
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = [0, 0, value]
+        summary[0] += 1
+        summary[1] += value
+        summary[2] = max(summary[2], value)
+
+def _observe_duration(stage_name, seconds):
+    key = _key("qrgb_stage_seconds", {"stage": stage_name})
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0, 0.0, 0.0, [0] * len(STAGE_BUCKETS)]
+        histogram[0] += 1
+        histogram[1] += seconds
+        histogram[2] = max(histogram[2], seconds)
+        for index, bound in enumerate(STAGE_BUCKETS):
+            if seconds <= bound:
+                histogram[3][index] += 1
+                break
+    current = getattr(_local, "operation", None)
+    if current is not None:
+        current[stage_name] = current.get(stage_name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    # Cronometrar una etapa (histograma qrgb_stage_seconds{stage=...})
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _observe_duration(name, time.perf_counter() - start)
+
+def register_cache(name, cache):
+    # Cachés LRUCache cuyas estadísticas (aciertos, fallos, bytes) se exportan con las métricas
+    _caches[name] = cache
+
+def _start_profilers():
+    tracing = False
+    if "tracemalloc" in PROFILE_MODES:
+        import tracemalloc
+        
+        # El pico de tracemalloc es de todo el proceso: las operaciones perfiladas se serializan
+        # (p. ej. varias sesiones de Streamlit) para que ninguna lo reinicie o lo pare bajo otra
+        _tracemalloc_lock.acquire()
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    profiler = None
+    if "cprofile" in PROFILE_MODES:
+        import cProfile
+        
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler, tracing
+
+def _stop_profilers(name, profiler, tracing, record):
+    if "tracemalloc" in PROFILE_MODES:
+        import tracemalloc
+        
+        try:
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            if tracing:
+                tracemalloc.stop()
+        finally:
+            _tracemalloc_lock.release()
+        observe("qrgb_operation_peak_bytes", record["peak_bytes"], operation=name)
+    if profiler is not None:
+        import io
+        import pstats
+        
+        profiler.disable()
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{threading.get_ident()}.prof")
+            profiler.dump_stats(path)
+            record["profile"] = path
+        else:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            logger.info(f"Profile of {name}:\n{stream.getvalue()}")
+
+@contextmanager
+def operation(name, **fields):
+    # Operación de nivel superior (generar o decodificar un código): se cronometra como etapa y,
+    # según el entorno, se perfila y se registra como JSON con el tiempo de cada etapa interna.
+    # Al salir, el registro incluye total_ms y stages_ms. Las operaciones anidadas solo cuentan
+    # como etapas y comparten el registro de la operación exterior
+    if not METRICS_ENABLED:
+        yield {}
+        return
+    if getattr(_local, "operation", None) is not None:
+        with stage(name):
+            yield _local.record
+        return
+    
+    stages = _local.operation = {}
+    record = _local.record = {"operation": name, **fields}
+    profiler, tracing = _start_profilers() if PROFILE_MODES else (None, False)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.operation = _local.record = None
+        _observe_duration(name, elapsed)
+        if PROFILE_MODES:
+            _stop_profilers(name, profiler, tracing, record)
+        record["total_ms"] = round(elapsed * 1000, 3)
+        record["stages_ms"] = {key: round(value * 1000, 3) for key, value in stages.items()}
+        if METRICS_LOG:
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+def metrics_snapshot():
+    # Copia de todas las métricas como estructura JSON
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()]
+        summaries = [
+            {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum}
+            for (name, labels), (count, total, maximum) in _summaries.items()
+        ]
+        stages = [
+            {
+                "stage": dict(labels)["stage"], "count": count, "sum_seconds": total, "max_seconds": maximum,
+                "buckets": dict(zip(map(str, STAGE_BUCKETS), buckets)),
+            }
+            for (_, labels), (count, total, maximum, buckets) in _histograms.items()
+        ]
+    caches = {name: cache.stats() for name, cache in _caches.items()}
+    return {"counters": counters, "summaries": summaries, "stages": stages, "caches": caches}
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+def prometheus_text():
+    # Exposición en formato de texto de Prometheus (0.0.4)
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        summaries = sorted((key, tuple(summary)) for key, summary in _summaries.items())
+        histograms = sorted((key, (count, total, maximum, list(buckets))) for key, (count, total, maximum, buckets) in _histograms.items())
+    
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (count, total, _) in summaries:
+        if name not in typed:
+            lines.append(f"# TYPE {name} summary")
+            typed.add(name)
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+    for (name, labels), (count, total, _, buckets) in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket in zip(STAGE_BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+    
+    caches = sorted(_caches.items())
+    for metric, field, kind in (
+        ("qrgb_cache_hits_total", "hits", "counter"),
+        ("qrgb_cache_misses_total", "misses", "counter"),
+        ("qrgb_cache_bytes", "bytes", "gauge"),
+        ("qrgb_cache_entries", "entries", "gauge"),
+    ):
+        if caches:
+            lines.append(f"# TYPE {metric} {kind}")
+        for name, cache in caches:
+            lines.append(f"{metric}{_format_labels((('cache', name),))} {cache.stats()[field]}")
+    return "\n".join(lines) + "\n"
+
+def log_metrics():
+    # Volcar el estado actual como una línea JSON en el log
+    logger.info(json.dumps(metrics_snapshot(), ensure_ascii=False, default=str))
+
+def reset_metrics():
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+        _histograms.clear()
@@ -0,0 +1,216 @@
+# Almacén en disco de resultados direccionado por contenido: cada PNG se guarda con el hash de
+# lo que lo determina (datos, versión, corrección, tamaño de módulo, logo), de modo que varios
+# procesos y reinicios reutilizan los códigos ya generados. Las escrituras son atómicas (archivo
+# temporal + os.replace) y la expulsión es LRU por fecha de modificación, acotada en bytes y edad
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .metrics import increment, register_cache
+
+logger = logging.getLogger(__name__)
+
+# Directorio de datos del motor; el almacén vive en su subdirectorio "store"
+FOLDER_PATH = 'qrgb_files'
+STORE_PATH = os.environ.get("QRGB_STORE_PATH", os.path.join(FOLDER_PATH, "store"))
+# Límites del almacén (QRGB_STORE_MAX_BYTES=0 lo desactiva)
+STORE_MAX_BYTES = int(os.environ.get("QRGB_STORE_MAX_BYTES", 256 * 1024 * 1024))
+STORE_MAX_AGE = float(os.environ.get("QRGB_STORE_MAX_AGE", 30 * 24 * 3600))
+# Al superar el límite se expulsa hasta esta fracción, para no recorrer el directorio en cada escritura
+STORE_EVICT_TARGET = 0.8
+# Segundos entre recorridos del directorio (otros procesos también escriben en él)
+STORE_SCAN_INTERVAL = 60.0
+# Temporales huérfanos (procesos interrumpidos) más antiguos que esto se borran al recorrer
+_STALE_TEMP_SECONDS = 3600
+
+# Sube al cambiar la forma de rasterizar o codificar: invalida las entradas anteriores
+STORE_FORMAT = 1
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_END = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+def result_key(payloads, qr_version, error_correction, box_size, border, logo_digest=None):
+    # Hash SHA-256 de todo lo que determina los bytes del PNG
+    fields = [STORE_FORMAT, list(payloads), qr_version, error_correction, box_size, border, logo_digest]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _is_complete_png(data):
+    # Una escritura interrumpida antes del reemplazo nunca es visible, pero un archivo truncado
+    # (disco lleno, corte de luz sin fsync) se descarta en lugar de servirse
+    return data.startswith(_PNG_SIGNATURE) and data.endswith(_PNG_END)
+
+class ResultStore:
+    def __init__(self, path, max_bytes=STORE_MAX_BYTES, max_age=STORE_MAX_AGE):
+        self.path = path
+        self._max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # Estimación del contenido (se corrige en cada recorrido del directorio)
+        self.nbytes = 0
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+        self._last_scan = 0.0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        self._max_bytes = value
+        if value > 0:
+            self.evict()
+
+    @property
+    def enabled(self):
+        return self._max_bytes > 0
+
+    def _entry_path(self, key):
+        # Subdirectorios por los dos primeros caracteres del hash para no llenar un único directorio
+        return os.path.join(self.path, key[:2], f"{key}.png")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        increment("qrgb_store_lookups_total", result="hit" if hit else "miss")
+
+    def get(self, key):
+        # Bytes del PNG o None; un acierto renueva la fecha de modificación (orden LRU)
+        if not self.enabled:
+            return None
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                age = time.time() - os.fstat(entry_file.fileno()).st_mtime
+                data = entry_file.read()
+            if age > self.max_age or not _is_complete_png(data):
+                self._remove(entry_path)
+                data = None
+        except OSError:
+            # No existe o la ha expulsado otro proceso entre la apertura y la lectura
+            data = None
+        if data is not None:
+            try:
+                os.utime(entry_path)
+            except OSError:
+                # Almacén de solo lectura o de otro usuario: el acierto vale aunque no renueve el orden LRU
+                pass
+        self._count(data is not None)
+        return data
+
+    def put(self, key, data):
+        # Escritura atómica; devuelve True si la entrada queda en el almacén
+        if not self.enabled or len(data) > self._max_bytes:
+            return False
+        entry_path = self._entry_path(key)
+        try:
+            if os.path.exists(entry_path):
+                os.utime(entry_path)
+                return True
+            directory = os.path.dirname(entry_path)
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, "wb") as temp_file:
+                    temp_file.write(data)
+                os.replace(temp_path, entry_path)
+            except BaseException:
+                self._remove(temp_path)
+                raise
+        except OSError as e:
+            logger.error(f"Error writing to result store {self.path}: {str(e)}")
+            return False
+        
+        with self._lock:
+            self.nbytes += len(data)
+            self.entries += 1
+            due = self.nbytes > self._max_bytes or time.monotonic() - self._last_scan > STORE_SCAN_INTERVAL
+        if due:
+            self.evict()
+        return True
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def _scan(self):
+        # (fecha de modificación, bytes, ruta) de cada entrada; borra los temporales huérfanos
+        now = time.time()
+        entries = []
+        try:
+            shards = [entry.path for entry in os.scandir(self.path) if entry.is_dir()]
+        except OSError:
+            return entries
+        for shard in shards:
+            try:
+                files = list(os.scandir(shard))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > _STALE_TEMP_SECONDS:
+                        self._remove(entry.path)
+                elif entry.name.endswith(".png"):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        # Expulsar las entradas caducadas y, si se supera el límite, las usadas hace más tiempo
+        # hasta STORE_EVICT_TARGET del límite. Varios procesos pueden expulsar a la vez: borrar
+        # una entrada ya borrada no es un error
+        entries = sorted(self._scan())
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in entries)
+        target = self._max_bytes * STORE_EVICT_TARGET if total > self._max_bytes else self._max_bytes
+        kept = 0
+        for mtime, size, entry_path in entries:
+            if mtime >= cutoff and total <= target:
+                kept += 1
+                continue
+            if self._remove(entry_path):
+                increment("qrgb_store_evictions_total")
+            total -= size
+        with self._lock:
+            self.nbytes = total
+            self.entries = kept
+            self._last_scan = time.monotonic()
+        return kept
+
+    def clear(self):
+        for _, _, entry_path in self._scan():
+            self._remove(entry_path)
+        with self._lock:
+            self.nbytes = 0
+            self.entries = 0
+
+    def __len__(self):
+        return self.entries
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": self.entries,
+                "bytes": self.nbytes,
+                "max_bytes": self._max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+result_store = ResultStore(STORE_PATH)
+register_cache("result_store", result_store)
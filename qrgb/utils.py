@@ -0,0 +1,6 @@
+# Utilidades compartidas por el motor QRGB
+def as_bytes(file_or_bytes):
+    # Aceptar tanto bytes como un archivo subido (UploadedFile, BytesIO)
+    if isinstance(file_or_bytes, (bytes, bytearray)):
+        return bytes(file_or_bytes)
+    return file_or_bytes.getvalue()